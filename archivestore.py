@@ -0,0 +1,267 @@
+"""archivestore module
+Author = Richard D. Fears
+Created = 2026-10-17
+Description = Provides the ArchiveStore class, which keeps archived intervals in append-only
+	segment files, with a small catalog describing what each segment holds.
+"""
+# Standard Python library imports
+import os, sys, json, glob, gzip, lzma
+
+class ArchiveStore:
+	"""ArchiveStore class
+	Each line of a segment file is a single archived interval, as the JSON list
+	[timer,start,end,exported,description], where timer is the timer's key in the catalog.
+	Intervals are always appended to the newest segment, and a new segment is started once it
+	reaches SEGMENT_BYTES, so archiving only ever writes the new intervals.
+	The catalog (catalog.json) holds:
+		'segments': {name:{'bytes':n,'count':n,'min start':t,'max start':t}}
+		'timers': {timer:{'title','description','source system','count','min start',
+			'max start','segments':{name:{'count':n,'min start':t,'max start':t}}}}
+	A segment's 'bytes' is how much of it has been committed; anything after that (e.g. from a
+	crash before the catalog was written) is thrown away when the store is opened.
+	Segments may be compressed with gzip or lzma. Each batch of archived intervals is appended as
+	its own compressed member/stream (both formats allow these to be concatenated), so segments
+	stay append-only, and are decompressed a line at a time when read.
+	"""
+
+	CATALOG_FILENAME = 'catalog.json'
+	SEGMENT_FORMAT = 'segment-{:06d}.jsonl'
+	# Extra segment filename extension, compress function and open function for each compression
+	COMPRESSIONS = {
+		'':('',None,open),
+		'gzip':('.gz',gzip.compress,gzip.open),
+		'lzma':('.xz',lzma.compress,lzma.open),
+	}
+	# Size (after compression) after which a new segment is started
+	SEGMENT_BYTES = 4*1024*1024
+	# Filename pattern of the old one-file-per-title archives
+	LEGACY_PATTERN = 'YATTi_archive_*.json'
+	LEGACY_SUFFIX = '.migrated'
+	DEFAULT_CATALOG = {
+		'version':[1,0,0],
+		'segments':{},
+		'timers':{},
+	}
+
+	def __init__ (self, directory, legacydirectory=None, compression=''):
+		"""ArchiveStore constructor
+		Opens (and creates, if necessary) the archive in directory. If the archive is new and
+		legacydirectory is given, any old per-title archive files in it are imported (see
+		migrate_legacy). compression is one of the COMPRESSIONS ('' for none), and is used for
+		newly-archived intervals; existing segments are read whatever their compression.
+		"""
+		if compression not in self.COMPRESSIONS:
+			raise ValueError("Unknown archive compression "+str(compression))
+		self._compression = compression
+		self._directory = directory
+		if not os.path.exists(directory):
+			os.makedirs(directory)
+		self._catalogfilename = os.path.join(directory,self.CATALOG_FILENAME)
+		try:
+			with open(self._catalogfilename) as fileobj:
+				self._catalog = json.load(fileobj)
+			isnew = False
+		except:
+			self._catalog = json.loads(json.dumps(self.DEFAULT_CATALOG))
+			isnew = True
+		self._discard_uncommitted()
+		if isnew:
+			if legacydirectory != None:
+				self.migrate_legacy(legacydirectory)
+			self._write_catalog()
+
+	def _discard_uncommitted (self):
+		"""_discard_uncommitted internal function
+		Truncates each segment to the size recorded in the catalog.
+		"""
+		for name,segment in self._catalog['segments'].items():
+			filename = os.path.join(self._directory,name)
+			try:
+				if os.path.getsize(filename) > segment['bytes']:
+					with open(filename,'r+b') as fileobj:
+						fileobj.truncate(segment['bytes'])
+			except:
+				# TODO: Switch to debug log
+				print("Archive segment "+filename+" could not be checked.",file=sys.stderr)
+
+	def _write_catalog (self):
+		"""_write_catalog internal function
+		Writes the catalog to a temporary file and renames it over the old one, so that the
+		catalog is never left half-written.
+		"""
+		tempname = self._catalogfilename+".tmp"
+		with open(tempname,'w') as fileobj:
+			json.dump(self._catalog,fileobj,separators=(',',':'))
+			fileobj.flush()
+			os.fsync(fileobj.fileno())
+		os.replace(tempname,self._catalogfilename)
+
+	def _segment_for (self, numbytes):
+		"""_segment_for internal function
+		Returns the name of the segment which the next numbytes bytes should be appended to,
+		starting a new segment if the newest one is full.
+		"""
+		names = sorted(self._catalog['segments'])
+		extension = self.COMPRESSIONS[self._compression][0]
+		if len(names) > 0 and self._segment_compression(names[-1]) == self._compression and \
+			self._catalog['segments'][names[-1]]['bytes']+numbytes <= self.SEGMENT_BYTES:
+			return names[-1]
+		name = self.SEGMENT_FORMAT.format(len(names)+1)+extension
+		# Throw away anything left from a crash before this segment made it into the catalog
+		open(os.path.join(self._directory,name),'wb').close()
+		self._catalog['segments'][name] = {'bytes':0,'count':0,'min start':None,
+			'max start':None}
+		return name
+
+	def _segment_compression (self, name):
+		"""_segment_compression internal function
+		Returns the compression of the given segment, from its filename extension.
+		"""
+		for compression,(extension,compress,opener) in self.COMPRESSIONS.items():
+			if extension != '' and name.endswith(extension):
+				return compression
+		return ''
+
+	@staticmethod
+	def _update_range (entry, intervals):
+		"""_update_range internal function
+		Adds the intervals to a catalog entry's count and min/max start.
+		"""
+		starts = [interval[0] for interval in intervals]
+		entry['count'] += len(intervals)
+		if entry['min start'] == None or min(starts) < entry['min start']:
+			entry['min start'] = min(starts)
+		if entry['max start'] == None or max(starts) > entry['max start']:
+			entry['max start'] = max(starts)
+
+	def archive (self, timer, timerinfo, intervals, commit=True):
+		"""archive function
+		Appends the intervals to the archive under the given timer key. timerinfo is a dict with
+		the timer's 'title', 'description' and 'source system', which are stored in the catalog.
+		Returns the number of intervals archived. Raises an exception if they could not be
+		written, in which case nothing is archived.
+		If commit is False, the catalog is not written (see commit).
+		"""
+		# Keep a copy of the catalog to go back to if anything fails
+		backup = json.dumps(self._catalog)
+		try:
+			timerentry = self._catalog['timers'].setdefault(timer,{'count':0,'min start':None,
+				'max start':None,'segments':{}})
+			for key in ('title','description','source system'):
+				timerentry[key] = timerinfo.get(key,'')
+			if len(intervals) > 0:
+				data = "".join(json.dumps([timer]+list(interval[:4]),separators=(',',':'))+"\n"
+					for interval in intervals).encode('utf-8')
+				compress = self.COMPRESSIONS[self._compression][1]
+				if compress != None:
+					data = compress(data)
+				name = self._segment_for(len(data))
+				segment = self._catalog['segments'][name]
+				with open(os.path.join(self._directory,name),'r+b') as fileobj:
+					fileobj.seek(segment['bytes'])
+					fileobj.write(data)
+					fileobj.truncate()
+					fileobj.flush()
+					os.fsync(fileobj.fileno())
+				segment['bytes'] += len(data)
+				self._update_range(segment,intervals)
+				self._update_range(timerentry,intervals)
+				self._update_range(timerentry['segments'].setdefault(name,{'count':0,
+					'min start':None,'max start':None}),intervals)
+			if commit:
+				self.commit()
+		except:
+			self._catalog = json.loads(backup)
+			# Readers rely on segments never holding anything past their committed bytes
+			self._discard_uncommitted()
+			raise
+		return len(intervals)
+
+	def commit (self):
+		"""commit function
+		Writes the catalog, making everything archived so far permanent.
+		"""
+		self._write_catalog()
+
+	def timers (self):
+		"""timers function
+		Returns the catalog entries of every archived timer, as a dict keyed by timer key.
+		"""
+		return self._catalog['timers']
+
+	def query (self, start=None, end=None, timer=None):
+		"""query generator
+		Yields (timer,interval) for every archived interval which starts within [start,end),
+		optionally only for the given timer key. Any criteria which are None are not restricted.
+		Only the segments whose catalog start range overlaps [start,end) are read.
+		"""
+		if timer == None:
+			ranges = self._catalog['segments']
+		elif timer in self._catalog['timers']:
+			ranges = self._catalog['timers'][timer]['segments']
+		else:
+			ranges = {}
+		for name in sorted(ranges):
+			segmentrange = ranges[name]
+			if segmentrange['count'] == 0 or \
+				(start != None and segmentrange['max start'] < start) or \
+				(end != None and segmentrange['min start'] >= end):
+				continue
+			for record in self._read_segment(name):
+				if (timer == None or record[0] == timer) and \
+					(start == None or record[1] >= start) and (end == None or record[1] < end):
+					yield record[0],record[1:]
+
+	def totals (self, start=None, end=None, timer=None):
+		"""totals function
+		Returns a dict of timer key -> total archived seconds, for the intervals which query would
+		yield with the same arguments.
+		"""
+		totals = {}
+		for key,interval in self.query(start,end,timer):
+			totals[key] = totals.get(key,0)+interval[1]-interval[0]
+		return totals
+
+	def _read_segment (self, name):
+		"""_read_segment internal generator
+		Yields each record of the given segment, decompressing as it goes. Segments never hold
+		anything past their committed bytes while the store is open (see _discard_uncommitted).
+		"""
+		opener = self.COMPRESSIONS[self._segment_compression(name)][2]
+		with opener(os.path.join(self._directory,name),'rb') as fileobj:
+			for line in fileobj:
+				yield json.loads(line)
+
+	def migrate_legacy (self, legacydirectory):
+		"""migrate_legacy function
+		Imports every old per-title archive file (YATTi_archive_<title>.json) in the given
+		directory, keyed by timer_key, and renames each one with a .migrated suffix. Returns the
+		number of intervals imported.
+		"""
+		imported = 0
+		for filename in sorted(glob.glob(os.path.join(glob.escape(legacydirectory),
+			self.LEGACY_PATTERN))):
+			try:
+				with open(filename) as fileobj:
+					archivedata = json.load(fileobj)
+				imported += self.archive(self.timer_key(archivedata),archivedata,
+					archivedata.get('intervals',[]),commit=False)
+				self.commit()
+				os.replace(filename,filename+self.LEGACY_SUFFIX)
+			# TODO: Switch to debug log
+			except:
+				print("Archive "+filename+" could not be imported.",file=sys.stderr)
+		return imported
+
+	@staticmethod
+	def timer_key (timerinfo):
+		"""timer_key function
+		Returns the catalog key for a timer dict, based on its source system and title.
+		"""
+		return json.dumps([timerinfo.get('source system',''),timerinfo.get('title','')])
+
+	def close (self):
+		"""close function
+		Nothing to close, as the segment files are only open while reading/appending.
+		"""
+		pass
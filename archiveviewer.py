@@ -0,0 +1,216 @@
+"""archiveviewer module
+Author = Richard D. Fears
+Created = 2026-10-17
+Description = Provides the ArchiveViewer Tk widget, which lists the archived intervals for a
+	timer and/or date range, along with their total time.
+"""
+# Tk imports
+import tkinter as tk
+import tkinter.font as tkfont
+# Standard Python library imports
+import time
+# My code imports
+import helper
+from versionexception import VersionException
+
+class ArchiveViewer (tk.Toplevel):
+	"""ArchiveViewer class
+	Displays a toplevel widget for searching the archive (see ArchiveStore.query) by timer and
+	by an inclusive range of dates.
+	"""
+
+	# Format of the from/to date entries
+	DATE_FORMAT = '%Y-%m-%d'
+	# Maximum number of intervals listed; the total always includes every interval found
+	MAX_RESULTS = 1000
+	OLDEST_CONVERTIBLE_THEME_VERSION = [1,0,0]
+	DEFAULT_THEME = {
+		'version':[1,0,0],
+		'base':{
+			'widget':{},
+			'labels':{},
+			'entries':{},
+			'buttons':{},
+			'results':{},
+		},
+		'fonts':{
+			'labels':{'size':12,},
+			'entries':{'size':12,},
+			'buttons':{'size':12,},
+			'results':{'family':'Courier','size':10,},
+		},
+	}
+
+	def _theme_version_update (self, oldtheme):
+		"""_theme_version_update internal function
+		Updates the old theme to the new format, based on relative versions.
+		"""
+		# Check for versions which are incompatible with list-of-numbers versions
+		try:
+			oldtheme['version'] < [0]
+		except:
+			raise VersionException(VersionException.BAD_TYPE,oldtheme['version'])
+
+		# If the theme version is later than the program version, we will not know how to convert
+		if oldtheme['version'] > ArchiveViewer.DEFAULT_THEME['version']:
+			raise VersionException(VersionException.TOO_NEW,
+				oldtheme['version'],ArchiveViewer.DEFAULT_THEME['version'])
+
+		# If the old version is too old, we will not know how to convert
+		if oldtheme['version'] < ArchiveViewer.OLDEST_CONVERTIBLE_THEME_VERSION:
+			raise VersionException(VersionException.TOO_OLD,
+				oldtheme['version'],ArchiveViewer.DEFAULT_THEME['version'])
+
+		# Finally, convert incrementally through all the versions
+		# Below is some sample code to copy:
+		#if oldtheme['version'] < [1,1]:
+		#	oldtheme['somevariable'] = oldtheme['oldvariable']
+		#	oldtheme['version'] = [1,1]
+
+	def __init__ (self, parent, archive, theme=None, *args, **options):
+		"""ArchiveViewer constructor
+		archive is the ArchiveStore to search. theme is a pre-populated version of the default
+		theme defined within this class.
+		"""
+		super().__init__(parent,*args,**options)
+		# Associate this popup with the parent, and prevent it from showing as a separate window
+		self.transient(parent)
+		# Name it
+		self.title("YATTi Archive")
+
+		### Initialize internal variables
+		self._archive = archive
+		self._parent = parent
+		self._theme = helper.dictVersionUpdate(theme,self._theme_version_update,
+			self.DEFAULT_THEME)
+		# Timer keys in the same order as the timer choices (None for all timers)
+		timers = self._archive.timers()
+		self._timer_keys = [None]+sorted(timers,key=lambda key: (timers[key]['title'],key))
+		timerchoices = ["All timers"]+[
+			"{} ({})".format(timers[key]['title'],timers[key]['source system'])
+			for key in self._timer_keys[1:]]
+
+		### Build the frame
+		# Fonts
+		self._font_labels = tkfont.Font()
+		self._font_entries = tkfont.Font()
+		self._font_buttons = tkfont.Font()
+		self._font_results = tkfont.Font()
+		# Search criteria
+		searchframe = tk.Frame(self)
+		searchframe.pack(fill='x')
+		self._timer_var = tk.StringVar(value=timerchoices[0])
+		self._timer_menu = tk.OptionMenu(searchframe,self._timer_var,*timerchoices)
+		self._timer_menu.pack(side='left')
+		self._timer_choices = timerchoices
+		self._from_label = tk.Label(searchframe,text="From",font=self._font_labels)
+		self._from_label.pack(side='left')
+		self._from_entry = tk.Entry(searchframe,width=11,font=self._font_entries)
+		self._from_entry.pack(side='left')
+		self._to_label = tk.Label(searchframe,text="To",font=self._font_labels)
+		self._to_label.pack(side='left')
+		self._to_entry = tk.Entry(searchframe,width=11,font=self._font_entries)
+		self._to_entry.pack(side='left')
+		self._search_button = tk.Button(searchframe,text="Search",font=self._font_buttons,
+			command=self._search)
+		self._search_button.pack(side='left')
+		# Results
+		resultsframe = tk.Frame(self)
+		resultsframe.pack(fill='both',expand=True)
+		self._results = tk.Listbox(resultsframe,width=100,height=25,font=self._font_results)
+		self._scrollbar = tk.Scrollbar(resultsframe,orient='vertical',
+			command=self._results.yview)
+		self._results.config(yscrollcommand=self._scrollbar.set)
+		self._scrollbar.pack(side='right',fill='y')
+		self._results.pack(side='left',fill='both',expand=True)
+		self._total_label = tk.Label(self,text=" ",font=self._font_labels)
+		self._total_label.pack()
+
+		# Default to this month
+		today = time.localtime()
+		self._from_entry.insert(0,time.strftime(self.DATE_FORMAT,
+			(today.tm_year,today.tm_mon,1,0,0,0,0,1,-1)))
+		self._to_entry.insert(0,time.strftime(self.DATE_FORMAT,today))
+		self._from_entry.bind('<Return>',lambda e,self=self: self._search())
+		self._to_entry.bind('<Return>',lambda e,self=self: self._search())
+
+		self.update_theme()
+		self._search()
+
+	def _parse_date (self, entry, nextday=False):
+		"""_parse_date internal function
+		Returns the Unixtime of local midnight at the start of the date in the given entry (or
+		the day after, if nextday is True), None if the entry is blank, or False if the date
+		cannot be parsed.
+		"""
+		text = entry.get().strip()
+		if text == "":
+			return None
+		try:
+			day = time.localtime(helper.parseLocalTime(text,self.DATE_FORMAT))
+		except ValueError:
+			return False
+		return time.mktime((day.tm_year,day.tm_mon,day.tm_mday+(1 if nextday else 0),
+			0,0,0,0,0,-1))
+
+	def _search (self):
+		"""_search internal function
+		Lists the archived intervals matching the selected timer and dates, and their total.
+		"""
+		start = self._parse_date(self._from_entry)
+		end = self._parse_date(self._to_entry,nextday=True)
+		if start is False or end is False:
+			self._total_label.configure(fg='red',
+				text="Dates must be in the form YYYY-MM-DD")
+			return
+		timer = self._timer_keys[self._timer_choices.index(self._timer_var.get())]
+		timers = self._archive.timers()
+		self._results.delete(0,tk.END)
+		rows = []
+		count = 0
+		total = 0
+		for key,interval in self._archive.query(start,end,timer):
+			count += 1
+			total += interval[1]-interval[0]
+			if count <= self.MAX_RESULTS:
+				rows.append("{}  {}-{}  {:>6.2f}h  {}  {}".format(
+					helper.formatLocalTime(self.DATE_FORMAT,interval[0]),
+					helper.formatLocalTime('%H:%M',interval[0]),
+					helper.formatLocalTime('%H:%M',interval[1]),
+					(interval[1]-interval[0])/60/60,
+					timers[key]['title'] if key in timers else key,
+					interval[3]))
+		self._results.insert(tk.END,*rows)
+		text = "{} intervals, {:.2f} hours".format(count,total/60/60)
+		if count > self.MAX_RESULTS:
+			text += " (first {} listed)".format(self.MAX_RESULTS)
+		self._total_label.configure(fg='black',text=text)
+
+	def update_theme (self):
+		"""update_theme function
+		Updates the fonts/colors/styles from the theme attribute. Used when the user changes
+		the theme.
+		"""
+		widgets = (
+			(self,'widget'),
+			(self._from_label,'labels'),
+			(self._to_label,'labels'),
+			(self._total_label,'labels'),
+			(self._from_entry,'entries'),
+			(self._to_entry,'entries'),
+			(self._timer_menu,'buttons'),
+			(self._search_button,'buttons'),
+			(self._results,'results'),
+		)
+		fontwidgets = (
+			(self._font_labels,'labels'),
+			(self._font_entries,'entries'),
+			(self._font_buttons,'buttons'),
+			(self._font_results,'results'),
+		)
+
+		# Update the theme for each of the sub-widgets and fonts
+		for widget,name in widgets:
+			helper.configThemeFromDict(widget,self._theme,'base',name)
+		for widget,name in fontwidgets:
+			helper.configThemeFromDict(widget,self._theme,'fonts',name)
@@ -10,7 +10,8 @@ import tkinter.font as tkfont
 import tkinter.filedialog as tkfiledialog
 import tkinter.messagebox as tkmessagebox
 # Standard Python library imports
-import time, traceback
+import time, traceback, csv, heapq, tempfile, bisect, math, operator, itertools
+from array import array
 # My code imports
 import helper
 from versionexception import VersionException
@@ -85,6 +86,8 @@ class CSVExport (tk.Toplevel):
 			'starttime',
 		],
 	}
+	# Number of rows sorted in memory before spilling a sorted run to a temporary file
+	SORT_CHUNK_ROWS = 10000
 	OLDEST_CONVERTIBLE_THEME_VERSION = [1,0,0]
 	DEFAULT_THEME = {
 		'version':[1,0,0],
@@ -155,11 +158,14 @@ class CSVExport (tk.Toplevel):
 		#	oldtheme['somevariable'] = oldtheme['oldvariable']
 		#	oldtheme['version'] = [1,1]
 
-	def __init__ (self, parent, data, settings=None, theme=None, *args, **options):
+	def __init__ (self, parent, data, settings=None, theme=None, datastore=None, *args,
+		**options):
 		"""CSVExport constructor
 		settings and theme are pre-populated versions of each of the defaults defined within this
 		class, for initializing a CSV export widget with non-default settings/theme.
 		data is the timer data. It will be parsed and separated into the exported slices.
+		datastore, if given, is an SQLiteDataStore with every change to data recorded, which the
+		exported slices are then queried from instead of scanning every timer.
 		"""
 		super().__init__(parent,*args,**options)
 		# Associate this popup with the parent, and prevent it from showing as a separate window
@@ -173,6 +179,7 @@ class CSVExport (tk.Toplevel):
 
 		### Initialize internal variables
 		self._all_timers = data['timerdata']
+		self._datastore = datastore
 		# Store the parent window for later reference
 		self._parent = parent
 		# Result for the parent after closing this window
@@ -256,40 +263,43 @@ class CSVExport (tk.Toplevel):
 
 	def _run_export (self):
 		"""_run_export internal function
-		Exports the calculated data to the indicated file and, if the user chose to, switches
+		Exports the selected intervals to the indicated file and, if the user chose to, switches
 		the exported flag on each of the newly-exported intervals.
-		Internal dev note: It is assumed that update_data has already been run with the most
-		recent user-selections. As such, any changes to user-selections should automatically
-		run update_data.
+		The rows are streamed from the timer data through to the CSV writer (see _export_rows), so
+		only the summary groups and one sort chunk are ever held in memory.
+		If any of the selected intervals overlap another timer's, the user is asked first, as
+		that time would be exported twice.
 		"""
+		overlaps = helper.findOverlaps(self._all_timers,
+			lambda interval: self._settings['export all slices'] or not interval[2])
+		if len(overlaps) > 0 and not tkmessagebox.askyesno("Overlapping Time",
+			("{} time slices in {} timers overlap with time on other timers, and would be "+
+				"exported twice.\nExport anyway?").format(
+				sum(len(indexes) for indexes in overlaps.values()),len(overlaps)),
+			parent=self):
+			return
 		timestamp = time.strftime('%Y%m%d%H%M%S',time.localtime())
 		filename = self._settings['filename'].format(
 			timestamp=timestamp,fullsummary=self._fullsummary
 		)
 		filename = self._settings['filepath']+filename
 		try:
-			with open(filename,'w') as f:
-				f.writelines([",".join(self._settings['export columns'])])
-				f.write("\n")
-				for row in self._export_rows:
-					for i,item in enumerate(row):
-						if i > 0:
-							f.write(",")
-						if "," in item:
-							f.write("\""+item+"\"")
-						else:
-							f.write(item)
-					f.write("\n")
+			numrows = 0
+			with open(filename,'w',newline='') as f:
+				writer = csv.writer(f)
+				writer.writerow(self._settings['export columns'])
+				for row in self._export_rows():
+					writer.writerow(row)
+					numrows += 1
 
 			if self._settings['mark as exported']:
-				for timer in self._export_timers:
-					for interval in timer['intervals']:
-						interval[2] = True
+				for timerindex,position,interval in self._selected_intervals():
+					self._all_timers[timerindex]['intervals'][position][2] = True
 
 			self._result = 'success'
 			tkmessagebox.showinfo("Export Successful",
 				"Export to {} succeeded.\n{} rows exported.".format(
-					filename,len(self._export_rows)
+					filename,numrows
 				)
 			)
 		except:
@@ -312,138 +322,208 @@ class CSVExport (tk.Toplevel):
 
 	def update_data (self):
 		"""update_data function
-		Updates the file-chooser entry based on chosen directory and options. Also updates the
-		preview window based on options. In the background, it updates the calculations for same.
+		Updates the file-chooser entry based on chosen directory and options. The export rows
+		themselves are only calculated (streamed) when the export is run.
 		"""
 		### Update settings from entries/radiobuttons/checkboxes first
 		self._fullsummary = 'fullsummary'
+		# Local days seen so far (see _local_day), which depend on the date format
+		self._day_starts = []
+		self._days = {}
+
+		### Update displays
+		self._update_filepath_entry()
+		# No preview window to update yet
+
+	def _selected_intervals (self):
+		"""_selected_intervals internal generator
+		Yields (timer index,interval index,interval) for every interval which should be exported,
+		grouped by timer. If there is a datastore, the intervals are queried from its index of
+		exported flags (and each timer's are sorted by start).
+		"""
+		# Unless exporting everything, only export what has not been exported yet
+		exported = None if self._settings['export all slices'] else False
+		if self._datastore != None:
+			yield from self._datastore.query_intervals(exported)
+			return
+		for timerindex,timer in enumerate(self._all_timers):
+			for position,interval in enumerate(timer['intervals']):
+				if exported == None or not interval[2]:
+					yield timerindex,position,interval
+
+	def _flat_rows (self):
+		"""_flat_rows internal generator
+		Yields a flattened row dict for each selected interval.
+		"""
+		for timerindex,position,interval in self._selected_intervals():
+			timer = self._all_timers[timerindex]
+			row = {}
+			row['source'] = timer['source system']
+			row['title'] = timer['title']
+			row['description'] = timer['description']
+			row['previousexport'] = str(interval[2])
+			row['task'] = interval[3]
+			row['startdate'] = self._local_day(interval[0])[2]
+			row['starttime'] = helper.formatLocalTime(self._settings['time formats']['time'],
+				interval[0])
+			row['endtime'] = helper.formatLocalTime(self._settings['time formats']['time'],
+				interval[1])
+			row['rawduration'] = (interval[1]-interval[0])/60/60
+			yield row
+
+	def _format_duration (self, rawhours, durationformat):
+		"""_format_duration internal function
+		Formats a number of hours with the given duration format from the settings.
+		"""
+		inthours = int(rawhours)
+		intminutes = int((rawhours-inthours)*60)
+		roundingamount = self._settings['time formats']['duration']['roundingamount']
+		roundedhours = round(rawhours/roundingamount)*roundingamount
+		return durationformat.format(
+			rawhours=rawhours,
+			inthours=inthours,
+			intminutes=intminutes,
+			roundedhours=roundedhours
+		)
 
-		### Update calculations next
-		# Gather all unexported timeslices
-		self._export_timers = []
-		for timer in self._all_timers:
-			intervals = []
-			for interval in timer['intervals']:
-				# If not exported yet, add it to the slices to export
-				if self._settings['export all slices'] or not interval[2]:
-					intervals.append(interval)
-			# If any slices should be exported, add this timer and its slices
-			if len(intervals) > 0:
-				export_timer = {}
-				export_timer['title'] = timer['title']
-				export_timer['description'] = timer['description']
-				export_timer['source system'] = timer['source system']
-				export_timer['intervals'] = intervals
-				self._export_timers.append(export_timer)
-		# Calculate and flatten slices
-		flat_rows = []
+	def _full_rows (self):
+		"""_full_rows internal generator
+		Yields an export row for each selected interval.
+		"""
+		durationformat = self._settings['time formats']['duration']['full']
+		for row in self._flat_rows():
+			export_row = []
+			for column in self._settings['export columns']:
+				if column == 'type':
+					export_row.append("Full")
+				elif column == 'duration':
+					export_row.append(self._format_duration(row['rawduration'],durationformat))
+				elif column in row:
+					export_row.append(row[column])
+				else:
+					# TODO: Add debug logging here
+					export_row.append("")
+			yield export_row
+
+	def _local_day (self, timestamp):
+		"""_local_day internal function
+		Returns (start,end,datestring) for the local day containing the given Unixtime. Days are
+		cached by their start (local midnight) and found with a bisect, so localtime/strftime
+		are only called once per day rather than once per interval.
+		"""
+		i = bisect.bisect_right(self._day_starts,timestamp)-1
+		if i >= 0:
+			day = self._days[self._day_starts[i]]
+			if timestamp < day[1]:
+				return day
+		localtime = time.localtime(timestamp)
+		# mktime normalizes the day after the end of the month, and works out DST for us
+		start = time.mktime((localtime.tm_year,localtime.tm_mon,localtime.tm_mday,0,0,0,0,0,-1))
+		end = time.mktime((localtime.tm_year,localtime.tm_mon,localtime.tm_mday+1,0,0,0,0,0,-1))
+		day = (start,end,helper.formatLocalTime(self._settings['time formats']['date'],timestamp))
+		bisect.insort(self._day_starts,start)
+		self._days[start] = day
+		return day
+
+	def _summary_rows (self):
+		"""_summary_rows internal generator
+		Sums the durations and tasks of the selected intervals for each
+		(source,title,description,startdate) group, then yields an export row for each group.
+		Each timer's selected intervals are sorted into columns of start and end times, so that
+		each day is a contiguous slice, found by bisecting for the next local midnight and summed
+		in one pass.
+		"""
 		summed_durations = {}
 		summed_tasks = {}
-		for timer in self._export_timers:
-			for interval in timer['intervals']:
-				# Flatten interval for full rows
-				row = {}
-				row['source'] = timer['source system']
-				row['title'] = timer['title']
-				row['description'] = timer['description']
-				row['previousexport'] = str(interval[2])
-				row['task'] = interval[3]
-				row['startdate'] = time.strftime(self._settings['time formats']['date'],
-					time.localtime(interval[0]))
-				row['starttime'] = time.strftime(self._settings['time formats']['time'],
-					time.localtime(interval[0]))
-				row['endtime'] = time.strftime('%H:%M',time.localtime(interval[1]))
-				duration = (interval[1]-interval[0])/60/60
-				row['rawduration'] = duration
-				flat_rows.append(row)
-				# Sum the durations and tasks for summary rows
-				key = (row['source'],row['title'],row['description'],row['startdate'])
+		for timerindex,selected in itertools.groupby(self._selected_intervals(),
+			key=operator.itemgetter(0)):
+			timer = self._all_timers[timerindex]
+			# Intervals are normally sorted already, which makes this sort O(N)
+			intervals = sorted((selection[2] for selection in selected),
+				key=lambda interval: interval[0])
+			starts = array('d',[interval[0] for interval in intervals])
+			ends = array('d',[interval[1] for interval in intervals])
+			first = 0
+			while first < len(starts):
+				daystart,dayend,date = self._local_day(starts[first])
+				last = bisect.bisect_left(starts,dayend,first)
+				key = (timer['source system'],timer['title'],timer['description'],date)
 				if key not in summed_durations:
 					summed_durations[key] = 0
-					summed_tasks[key] = ""
-				summed_durations[key] += duration
-				if len(row['task']) > 0:
-					if len(summed_tasks[key]) > 0:
-						summed_tasks[key] += " "+row['task']
-					else:
-						summed_tasks[key] += row['task']
-					if summed_tasks[key][-1] not in (".",";"):
-						summed_tasks[key] += "."
-		# Build the full and summary rows, according to settings
-		self._export_rows = []
-		if self._settings['export full rows']:
-			durationformat = self._settings['time formats']['duration']['full']
-			for row in flat_rows:
-				rawhours = row['rawduration']
-				inthours = int(rawhours)
-				intminutes = int((rawhours-inthours)*60)
-				roundingamount = self._settings['time formats']['duration']['roundingamount']
-				roundedhours = round(rawhours/roundingamount)*roundingamount
-				export_row = []
-				for column in self._settings['export columns']:
-					if column == 'type':
-						export_row.append("Full")
-					elif column == 'duration':
-						duration = durationformat.format(
-							rawhours=rawhours,
-							inthours=inthours,
-							intminutes=intminutes,
-							roundedhours=roundedhours
-						)
-						export_row.append(duration)
-					elif column in row:
-						export_row.append(row[column])
-					else:
-						# TODO: Add debug logging here
-						export_row.append("")
-				self._export_rows.append(export_row)
-		if self._settings['export summary rows']:
-			durationformat = self._settings['time formats']['duration']['summary']
-			for key in summed_durations:
-				# key = (source,title,description,startdate)
-				rawhours = summed_durations[key]
-				task = summed_tasks[key]
-				inthours = int(rawhours)
-				intminutes = int((rawhours-inthours)*60)
-				roundingamount = self._settings['time formats']['duration']['roundingamount']
-				roundedhours = round(rawhours/roundingamount)*roundingamount
-				export_row = []
-				for column in self._settings['export columns']:
-					if column == 'type':
-						export_row.append("Summary")
-					elif column == 'source':
-						export_row.append(key[0])
-					elif column == 'title':
-						export_row.append(key[1])
-					elif column == 'description':
-						export_row.append(key[2])
-					elif column == 'startdate':
-						export_row.append(key[3])
-					elif column == 'duration':
-						duration = durationformat.format(
-							rawhours=rawhours,
-							inthours=inthours,
-							intminutes=intminutes,
-							roundedhours=roundedhours
-						)
-						export_row.append(duration)
-					elif column == 'task':
-						export_row.append(task)
-					else:
-						export_row.append("")
-				self._export_rows.append(export_row)
-		# Finally, sort the export rows according to settings
+					summed_tasks[key] = []
+				summed_durations[key] += math.fsum(
+					map(operator.sub,ends[first:last],starts[first:last]))/60/60
+				for interval in intervals[first:last]:
+					task = interval[3]
+					if len(task) > 0:
+						if task[-1] not in (".",";"):
+							task += "."
+						summed_tasks[key].append(task)
+				first = last
+		durationformat = self._settings['time formats']['duration']['summary']
+		for key in summed_durations:
+			# key = (source,title,description,startdate)
+			export_row = []
+			for column in self._settings['export columns']:
+				if column == 'type':
+					export_row.append("Summary")
+				elif column == 'source':
+					export_row.append(key[0])
+				elif column == 'title':
+					export_row.append(key[1])
+				elif column == 'description':
+					export_row.append(key[2])
+				elif column == 'startdate':
+					export_row.append(key[3])
+				elif column == 'duration':
+					export_row.append(self._format_duration(summed_durations[key],durationformat))
+				elif column == 'task':
+					export_row.append(" ".join(summed_tasks[key]))
+				else:
+					export_row.append("")
+			yield export_row
+
+	def _export_rows (self):
+		"""_export_rows internal generator
+		Yields the full and summary rows (according to settings), sorted by the sort columns.
+		"""
+		def rows ():
+			if self._settings['export full rows']:
+				yield from self._full_rows()
+			if self._settings['export summary rows']:
+				yield from self._summary_rows()
 		sort_indexes = []
 		for column in self._settings['sort columns']:
 			if column in self._settings['export columns']:
 				sort_indexes.append(self._settings['export columns'].index(column))
-		self._export_rows.sort(
-			key=lambda row,sort_indexes=sort_indexes: [row[i] for i in sort_indexes]
-		)
-
-		### Update displays
-		self._update_filepath_entry()
-		# No preview window to update yet
+		yield from self._sorted_rows(rows(),
+			lambda row,sort_indexes=sort_indexes: [row[i] for i in sort_indexes])
+
+	def _sorted_rows (self, rows, key):
+		"""_sorted_rows internal generator
+		Sorts the rows in chunks of SORT_CHUNK_ROWS, spilling each sorted chunk to a temporary
+		CSV file, and then merges the chunks. Like list.sort, the sort is stable.
+		Spilled rows come back as strings, so every cell is converted to a string up front (as the
+		CSV writer would), so that spilled and in-memory rows always compare alike.
+		"""
+		runs = []
+		try:
+			chunk = []
+			for row in rows:
+				chunk.append(["" if cell == None else str(cell) for cell in row])
+				if len(chunk) >= self.SORT_CHUNK_ROWS:
+					chunk.sort(key=key)
+					run = tempfile.TemporaryFile('w+',newline='')
+					csv.writer(run).writerows(chunk)
+					run.seek(0)
+					runs.append(run)
+					chunk = []
+			chunk.sort(key=key)
+			# The merge prefers earlier iterables on ties, so the final chunk goes last
+			yield from heapq.merge(*[csv.reader(run) for run in runs],chunk,key=key)
+		finally:
+			for run in runs:
+				run.close()
 
 	def _update_filepath_entry (self):
 		"""_update_filepath_entry internal function
@@ -7,6 +7,7 @@ Description = Provides the DataEditor Tk widget. This widget provides a grid of
 # Tk imports
 import tkinter as tk
 import tkinter.font as tkfont
+import tkinter.messagebox as tkmessagebox
 # Standard Python library imports
 import time
 # My code imports
@@ -25,6 +26,8 @@ class DataEditor (tk.Frame):
 			'basic':{'fg':'black','bg':'SystemButtonFace',},
 			'labels':{},
 			'entries':{},
+			# Table rows marked with highlight_rows (e.g. time which overlaps another timer)
+			'highlighted entries':{'bg':'#ffc0c0',},
 			'checkboxes':{},
 			'buttons':{},
 			'save button':{},
@@ -37,6 +40,8 @@ class DataEditor (tk.Frame):
 			'save button':{'size':12},
 		},
 	}
+	# Number of rows shown at once for tables which do not specify a 'page size'
+	DEFAULT_PAGE_SIZE = 25
 
 	def _theme_version_update (self, oldtheme):
 		"""_theme_version_update internal function
@@ -85,6 +90,8 @@ class DataEditor (tk.Frame):
 		Note that you cannot recursively build tables... yet.
 		The valid types are string, datetime, boolean, float, integer, and table. The 'key' field
 		refers to the key in the dictionary that will be used to populate these entries.
+		Tables are shown a page at a time; a table field may specify a 'page size' (number of
+		rows per page), otherwise DEFAULT_PAGE_SIZE is used.
 		"""
 		super().__init__(parent,*args,**options)
 
@@ -98,6 +105,8 @@ class DataEditor (tk.Frame):
 		self._table_field_state = 'readonly'
 		self._table_button_state = 'disabled'
 		self._save_button_state = 'disabled'
+		# Last string written to each entry widget, so unchanged cells can be skipped on refresh
+		self._rendered = {}
 
 		# Update the dataeditortheme parameters (or set to defaults)
 		self._theme = helper.dictVersionUpdate(dataeditortheme,self._theme_version_update,
@@ -116,6 +125,7 @@ class DataEditor (tk.Frame):
 			# One-row fields
 			if field['type'] != 'table':
 				field['entry'] = tk.Entry(self,font=self._entries_font,state=self._root_field_state)
+				self._track_edits(field['entry'])
 				field['entry'].grid(column=1,row=i,sticky='w')
 			# Multi-row/column fields
 			else:
@@ -125,11 +135,38 @@ class DataEditor (tk.Frame):
 					subfield['label'] = tk.Label(field['frame'],text=subfield['text'],
 						font=self._labels_font)
 					subfield['label'].grid(column=j,row=0,sticky='ew')
+					# Pool of entry widgets, reused for whichever rows are on the current page
 					subfield['rows'] = []
-					subfield['rows'].append(tk.Entry(field['frame'],font=self._entries_font,
-						state=self._table_field_state))
-					subfield['rows'][-1].grid(column=j,row=1,sticky='ew')
-				field['buttons'] = [] # Don't need buttons until we have data
+				field['delete buttons'] = []
+				# Data rows to highlight, and whether each pool row is currently highlighted
+				field['highlighted rows'] = set()
+				field['highlight shown'] = []
+				# Index of the first data row on the current page, and number of pool rows shown
+				if 'page size' not in field:
+					field['page size'] = self.DEFAULT_PAGE_SIZE
+				field['page start'] = 0
+				field['shown'] = 0
+				field['shown buttons'] = 0
+				# Number of data rows when the page was last shown
+				field['num rows'] = 0
+				# The add button and page controls go below the largest possible page, but are
+				# not shown until we have data
+				field['add button'] = tk.Button(field['frame'],text='+',font=self._buttons_font,
+					state=self._table_button_state,
+					command=lambda self=self,fieldindex=i:self._add_row(fieldindex))
+				field['page frame'] = tk.Frame(field['frame'])
+				field['prev button'] = tk.Button(field['page frame'],text=helper.LEFT_CHAR,
+					font=self._buttons_font,
+					command=lambda self=self,fieldindex=i:self._change_page(fieldindex,-1))
+				field['prev button'].pack(side='left')
+				field['page label'] = tk.Label(field['page frame'],font=self._labels_font)
+				field['page label'].pack(side='left')
+				field['next button'] = tk.Button(field['page frame'],text=helper.RIGHT_CHAR,
+					font=self._buttons_font,
+					command=lambda self=self,fieldindex=i:self._change_page(fieldindex,1))
+				field['next button'].pack(side='left')
+				# Show a single blank row until we have data
+				self._set_shown_rows(i,1)
 		# Finally, tack on the save button
 		self._save_button = tk.Button(self,text="Save",font=self._save_button_font,
 			command=self.save_data,state=self._save_button_state)
@@ -170,7 +207,7 @@ class DataEditor (tk.Frame):
 				return None
 		elif fieldtype == 'datetime':
 			try:
-				datavalue = time.mktime(time.strptime(fieldvalue,helper.DATE_FORMAT))
+				datavalue = helper.parseLocalTime(fieldvalue,helper.DATE_FORMAT)
 			except:
 				return None
 		else:
@@ -194,7 +231,7 @@ class DataEditor (tk.Frame):
 		# Convert datavalue from the type to string
 		if fieldtype == 'datetime':
 			try:
-				fieldvalue = time.strftime(helper.DATE_FORMAT,time.localtime(datavalue))
+				fieldvalue = helper.formatLocalTime(helper.DATE_FORMAT,datavalue)
 			except:
 				return None
 		else:
@@ -205,16 +242,18 @@ class DataEditor (tk.Frame):
 
 	def _delete_row (self, fieldindex, rowindex):
 		"""_delete_row internal function
-		Deletes a row from a table field.
+		Deletes a row from a table field. rowindex is the index in the data, not on the page.
 		"""
 		# Delete the data from the data dict
 		datakey = self._conf[fieldindex]['key']
 		del self._data[datakey][rowindex]
-		self._rebuild_table(fieldindex)
+		# Only the deleted row and the rows after it on the page need to be re-read
+		self._show_page(fieldindex,firstchanged=rowindex)
 
 	def _add_row (self, fieldindex):
 		"""_add_row internal function
-		Adds a row to the end of the grid for the given table field.
+		Adds a row to the data for the given table field (at the end, unless the data keeps itself
+		sorted), and shows its page.
 		"""
 		# Construct the new row based on defaults for the column types
 		field = self._conf[fieldindex]
@@ -230,73 +269,199 @@ class DataEditor (tk.Frame):
 				newrow.append(time.time())
 			else:
 				newrow.append('')
-		# Add the row to the data dict and then refresh the view of it
+		# Add the row to the data dict and then refresh the view of it. Sorted data (e.g. an
+		# IntervalStore) keeps itself in order.
 		datakey = field['key']
-		self._data[datakey].append(newrow)
-		self._rebuild_table(fieldindex)
+		if hasattr(self._data[datakey],'insert_sorted'):
+			rowindex = self._data[datakey].insert_sorted(newrow).index
+		else:
+			self._data[datakey].append(newrow)
+			rowindex = len(self._data[datakey])-1
+		self._show_page(fieldindex,rowindex,firstchanged=rowindex)
+
+	def _change_page (self, fieldindex, direction):
+		"""_change_page internal function
+		Moves the given table field to the previous (direction=-1) or next (direction=1) page.
+		If anything on the current page has been edited, the user is first asked whether to save
+		the edits, discard them, or stay on the page.
+		"""
+		field = self._conf[fieldindex]
+		if self._has_unsaved_edits(fieldindex):
+			answer = tkmessagebox.askyesnocancel("Unsaved Changes",
+				"Save the changes on this page before changing page?",parent=self)
+			if answer == None:
+				return
+			if answer:
+				self.save_data()
+		self._show_page(fieldindex,field['page start']+direction*field['page size'])
+
+	def _has_unsaved_edits (self, fieldindex):
+		"""_has_unsaved_edits internal function
+		Returns True if any shown cell of the table has been edited since it was last read from
+		the data (edited cells are dropped from the rendered strings; see _entry_edited).
+		"""
+		field = self._conf[fieldindex]
+		return any(entry not in self._rendered
+			for subfield in field['columns'] for entry in subfield['rows'][:field['shown']])
 
-	def _rebuild_table (self, fieldindex, initial=False):
-		"""_rebuild_table internal function
-		Removes all the entry widgets from the given table and then readds based on the data.
+	def _grow_table (self, fieldindex, count):
+		"""_grow_table internal function
+		Adds entry widgets (and their '-' buttons) to the table's pool until it has at least
+		count rows. New widgets are themed as they are created.
 		"""
 		field = self._conf[fieldindex]
-		# Delete entries
-		for subfield in field['columns']:
-			for row in subfield['rows']:
-				row.destroy()
-			subfield['rows'] = []
-		# Delete add/delete buttons
-		for i in range(len(field['buttons'])):
-			field['buttons'][i].destroy()
-		field['buttons'] = []
-		# Re-add entries
-		datakey = field['key']
-		for i,subfield in enumerate(field['columns']):
-			for j,row in enumerate(self._data[datakey]):
+		while len(field['delete buttons']) < count:
+			poolrow = len(field['delete buttons'])
+			for subfield in field['columns']:
 				if subfield['type'] == 'boolean':
-					subfield['rows'].append(tk.Entry(field['frame'],width=5,
-						font=self._entries_font,state=self._table_field_state))
+					entry = tk.Entry(field['frame'],width=5,
+						font=self._entries_font,state=self._table_field_state)
 				else:
-					subfield['rows'].append(tk.Entry(field['frame'],
-						font=self._entries_font,state=self._table_field_state))
-				self._read_data(fieldindex,i,j)
-				subfield['rows'][-1].grid(column=i,row=j+1,sticky='ew')
-		# Re-add buttons
-		for j in range(len(self._data[datakey])):
-			field['buttons'].append(
-				tk.Button(field['frame'],text='-',font=self._buttons_font,
-					state=self._table_button_state,
-					command=lambda self=self,fieldindex=fieldindex,rowindex=j:
-						self._delete_row(fieldindex,rowindex)))
-			field['buttons'][-1].grid(column=len(field['columns'])+1,row=j+1)
-		field['buttons'].append(
-			tk.Button(field['frame'],text='+',font=self._buttons_font,
+					entry = tk.Entry(field['frame'],
+						font=self._entries_font,state=self._table_field_state)
+				helper.configThemeFromDict(entry,self._theme,'base','entries')
+				self._track_edits(entry)
+				subfield['rows'].append(entry)
+			button = tk.Button(field['frame'],text='-',font=self._buttons_font,
 				state=self._table_button_state,
-				command=lambda self=self,fieldindex=fieldindex:self._add_row(fieldindex)))
-		field['buttons'][-1].grid(
-			column=0,row=len(self._data[datakey])+1,columnspan=len(field['columns'])+1)
-		# Refresh the theme if this is not being called from the data setup function
-		if not initial:
-			self.update_theme()
-
-	def _refresh_table (self, fieldindex):
+				command=lambda self=self,fieldindex=fieldindex,poolrow=poolrow:
+					self._delete_row(fieldindex,self._conf[fieldindex]['page start']+poolrow))
+			helper.configThemeFromDict(button,self._theme,'base','buttons')
+			field['delete buttons'].append(button)
+			field['highlight shown'].append(False)
+
+	def _set_shown_rows (self, fieldindex, count, withbuttons=False):
+		"""_set_shown_rows internal function
+		Grids the first count rows of the table's pool and removes the rest from the grid. Only
+		the rows whose visibility changes are touched.
+		"""
+		field = self._conf[fieldindex]
+		self._grow_table(fieldindex,count)
+		for k in range(count,field['shown']):
+			for subfield in field['columns']:
+				subfield['rows'][k].grid_remove()
+			field['delete buttons'][k].grid_remove()
+		for k in range(field['shown'],count):
+			for j,subfield in enumerate(field['columns']):
+				subfield['rows'][k].grid(column=j,row=k+1,sticky='ew')
+		field['shown'] = count
+		# The delete buttons are only shown when there is data to delete
+		buttoncount = count if withbuttons else 0
+		for k in range(buttoncount,field['shown buttons']):
+			field['delete buttons'][k].grid_remove()
+		for k in range(field['shown buttons'],buttoncount):
+			field['delete buttons'][k].grid(column=len(field['columns'])+1,row=k+1)
+		field['shown buttons'] = buttoncount
+
+	def _show_page (self, fieldindex, pagestart=None, firstchanged=None):
+		"""_show_page internal function
+		Shows the page containing data row pagestart (by default, the current page), reusing the
+		pooled widgets. If the page does not change, only rows from data row firstchanged
+		onwards are re-read; by default, all rows on the page are re-read.
+		"""
+		field = self._conf[fieldindex]
+		datarows = self._data[field['key']]
+		pagesize = field['page size']
+		if pagestart == None:
+			pagestart = field['page start']
+		# Snap to the start of a page, within the data
+		lastpagestart = max(len(datarows)-1,0)//pagesize*pagesize
+		pagestart = min(max(pagestart,0)//pagesize*pagesize,lastpagestart)
+		if pagestart != field['page start'] or firstchanged == None:
+			firstchanged = pagestart
+		field['page start'] = pagestart
+		field['num rows'] = len(datarows)
+		self._set_shown_rows(fieldindex,min(pagesize,len(datarows)-pagestart),withbuttons=True)
+		self._refresh_table(fieldindex,max(firstchanged-pagestart,0))
+		self._update_highlights(fieldindex)
+		self._update_page_controls(fieldindex)
+
+	def _update_highlights (self, fieldindex):
+		"""_update_highlights internal function
+		Highlights the shown rows of the table which are in its highlighted rows, and removes the
+		highlight from the rest. Only the pool rows whose highlight changes are touched.
+		"""
+		field = self._conf[fieldindex]
+		highlighttheme = self._theme['base']['highlighted entries']
+		for k in range(field['shown']):
+			highlighted = field['page start']+k in field['highlighted rows']
+			if field['highlight shown'][k] == highlighted:
+				continue
+			field['highlight shown'][k] = highlighted
+			for subfield in field['columns']:
+				entry = subfield['rows'][k]
+				for option,value in highlighttheme.items():
+					if not highlighted:
+						# Put back the themed value, or failing that the Tk default
+						value = self._theme['base']['entries'].get(option,entry.configure(option)[3])
+					entry.configure({option:value})
+
+	def highlight_rows (self, key, rows):
+		"""highlight_rows function
+		Highlights the given data row indexes of the table with the given key (see the
+		'highlighted entries' theme), replacing any previous highlights. The highlights are
+		cleared whenever new data is loaded.
+		"""
+		for i,field in enumerate(self._conf):
+			if field['key'] == key and field['type'] == 'table':
+				field['highlighted rows'] = set(rows)
+				if self._data != None:
+					self._update_highlights(i)
+
+	def _update_page_controls (self, fieldindex):
+		"""_update_page_controls internal function
+		Shows the add button, and shows/updates the page controls if there is more than one page.
+		"""
+		field = self._conf[fieldindex]
+		controlsrow = field['page size']+1
+		field['add button'].grid(column=0,row=controlsrow)
+		numrows = len(self._data[field['key']])
+		numpages = max((numrows+field['page size']-1)//field['page size'],1)
+		if numpages <= 1:
+			field['page frame'].grid_remove()
+			return
+		page = field['page start']//field['page size']
+		field['page label'].configure(text=" Page {} of {} ".format(page+1,numpages))
+		field['prev button'].configure(state='normal' if page > 0 else 'disabled')
+		field['next button'].configure(state='normal' if page < numpages-1 else 'disabled')
+		field['page frame'].grid(column=1,row=controlsrow,columnspan=len(field['columns']))
+
+	def _refresh_table (self, fieldindex, firstrow=0):
 		"""_refresh_table internal function
-		Re-reads the data from data dict into the given table.
+		Re-reads the data from data dict into the given table, for the shown rows from
+		firstrow (index on the page) onwards.
 		"""
 		field = self._conf[fieldindex]
-		datakey = field['key']
+		pagestart = field['page start']
 		for i,subfield in enumerate(field['columns']):
-			for j,row in enumerate(subfield['rows']):
-				self._read_data(fieldindex,i,j)
+			for k in range(firstrow,field['shown']):
+				self._read_data(fieldindex,i,pagestart+k)
+
+	def _track_edits (self, entrywidget):
+		"""_track_edits internal function
+		Forgets the rendered string for the entry widget whenever its contents are changed, so that
+		a user's edit is never mistaken for the data editor's own (unchanged) text.
+		"""
+		command = self.register(lambda self=self,entrywidget=entrywidget:
+			self._entry_edited(entrywidget))
+		entrywidget.configure(validate='key',validatecommand=command)
+
+	def _entry_edited (self, entrywidget):
+		"""_entry_edited callback function
+		Called by Tk before an entry widget's contents change. Always allows the change.
+		"""
+		self._rendered.pop(entrywidget,None)
+		return True
 
 	def _read_data (self, fieldindex, column=-1, row=-1):
 		"""_read_data internal function
 		Reads from the data dict and constructs a string to place in the indicated entry widget.
+		For tables, row is the index in the data, and must be on the current page.
 		"""
 		field = self._conf[fieldindex]
 		datakey = field['key']
 		if field['type'] == 'table':
-			entrywidget = field['columns'][column]['rows'][row]
+			entrywidget = field['columns'][column]['rows'][row-field['page start']]
 			datavalue = self._data[datakey][row][column]
 			fieldvalue = self._convert_data_to_field(datavalue,fieldindex,column)
 		else:
@@ -307,6 +472,9 @@ class DataEditor (tk.Frame):
 		# If we failed to convert, default to empty string
 		if fieldvalue == None:
 			fieldvalue = ""
+		# Nothing to do if the entry already shows this string
+		if self._rendered.get(entrywidget) == fieldvalue:
+			return
 
 		state = entrywidget.cget('state')
 		entrywidget.config(state='normal')
@@ -315,6 +483,7 @@ class DataEditor (tk.Frame):
 		entrywidget.delete(0,tk.END)
 		entrywidget.insert(0,fieldvalue)
 		entrywidget.config(state=state)
+		self._rendered[entrywidget] = fieldvalue
 
 	def _write_data (self, newvalue, fieldindex, column=-1, row=-1):
 		"""_write_data internal function
@@ -342,12 +511,12 @@ class DataEditor (tk.Frame):
 				self._data[field['key']] = ''
 
 			if field['type'] == 'table':
-				self._rebuild_table(i,initial=True)
+				field['highlighted rows'] = set()
+				# Start on the last page, where new/running intervals are
+				self._show_page(i,len(self._data[field['key']]))
 			else:
 				self._read_data(i)
 
-		self.update_theme()
-
 	def save_data (self):
 		"""save_data function
 		Converts and saves the field text to the data dict. If anything fails to convert,
@@ -368,15 +537,16 @@ class DataEditor (tk.Frame):
 						'badtext':field['entry'].get()
 					})
 			else:
+				# Only the rows on the current page can have been edited
 				for j,subfield in enumerate(field['columns']):
-					subfield['convertedvalues'] = [None for k in range(len(subfield['rows']))]
-					for k,row in enumerate(subfield['rows']):
+					subfield['convertedvalues'] = [None for k in range(field['shown'])]
+					for k,row in enumerate(subfield['rows'][:field['shown']]):
 						subfield['convertedvalues'][k] = self._convert_field_to_data(row,i,j)
 						if subfield['convertedvalues'][k] == None:
 							errors.append({
 								'label':field['text'],
 								'key':field['key'],
-								'tableindex':(k,j),
+								'tableindex':(field['page start']+k,j),
 								'type':subfield['type'],
 								'badtext':row.get()
 							})
@@ -388,8 +558,9 @@ class DataEditor (tk.Frame):
 					self._write_data(field['convertedvalue'],i)
 				else:
 					for j,subfield in enumerate(field['columns']):
-						for k,row in enumerate(subfield['rows']):
-							self._write_data(subfield['convertedvalues'][k],i,j,k)
+						for k in range(field['shown']):
+							self._write_data(subfield['convertedvalues'][k],i,j,
+								field['page start']+k)
 
 		# Let registered functions know that we finished
 		for f in self._save_callbacks:
@@ -423,7 +594,7 @@ class DataEditor (tk.Frame):
 		helper.configThemeFromDict(self._save_button_font,self._theme,'fonts','save button')
 		helper.configThemeFromDict(self._save_button,self._theme,'base','save button')
 		# Update widgets
-		for field in self._conf:
+		for i,field in enumerate(self._conf):
 			helper.configThemeFromDict(field['label'],self._theme,'base','labels')
 			if field['type'] != 'table':
 				helper.configThemeFromDict(field['entry'],self._theme,'base','entries')
@@ -432,8 +603,22 @@ class DataEditor (tk.Frame):
 					helper.configThemeFromDict(subfield['label'],self._theme,'base','labels')
 					for row in subfield['rows']:
 						helper.configThemeFromDict(row,self._theme,'base','entries')
-				for button in field['buttons']:
+				helper.configThemeFromDict(field['page label'],self._theme,'base','labels')
+				for button in self._table_buttons(field):
 					helper.configThemeFromDict(button,self._theme,'base','buttons')
+				# Redo the highlights on top of the new entry theme
+				highlighted = field['highlighted rows']
+				field['highlighted rows'] = set()
+				self._update_highlights(i)
+				field['highlighted rows'] = highlighted
+				self._update_highlights(i)
+
+	def _table_buttons (self, field):
+		"""_table_buttons internal function
+		Returns all of the buttons belonging to a table field.
+		"""
+		return field['delete buttons']+[field['add button'],field['prev button'],
+			field['next button']]
 
 	def update_data (self):
 		"""update_data function
@@ -453,14 +638,35 @@ class DataEditor (tk.Frame):
 		for i,field in enumerate(self._conf):
 			if field['key'] == key:
 				if field['type'] == 'table':
-					# Rebuild if the data has different number of rows than the entries
-					if len(field['columns'][0]['rows']) != len(self._data[key]):
-						self._rebuild_table(i)
+					# If we were on the last page, stay there as rows are added (e.g. a
+					# running timer's new interval)
+					if field['page start']+field['page size'] >= field['num rows']:
+						self._show_page(i,len(self._data[key]))
 					else:
-						self._refresh_table(i)
+						self._show_page(i)
 				else:
 					self._read_data(i)
 
+	def update_data_for_row (self, key, row):
+		"""update_data_for_row function
+		Updates a single row of a table, e.g. the last interval of a running timer. row may be
+		negative, to count from the end. If the number of rows has changed, the whole table is
+		updated instead.
+		"""
+		if self._data == None:
+			return
+		for i,field in enumerate(self._conf):
+			if field['key'] == key and field['type'] == 'table':
+				datarows = self._data[key]
+				if len(datarows) != field['num rows']:
+					self.update_data_for_key(key)
+					return
+				if row < 0:
+					row += len(datarows)
+				if field['page start'] <= row < field['page start']+field['shown']:
+					for j in range(len(field['columns'])):
+						self._read_data(i,j,row)
+
 	def enable (self, rootfields=True, tables=None):
 		"""enable function
 		Enables/disables the entry fields. rootfields controls everything but tables.
@@ -492,7 +698,7 @@ class DataEditor (tk.Frame):
 				for subfield in field['columns']:
 					for row in subfield['rows']:
 						row.configure(state=self._table_field_state)
-				for button in field['buttons']:
+				for button in field['delete buttons']+[field['add button']]:
 					button.configure(state=self._table_button_state)
 			else:
 				field['entry'].configure(state=self._root_field_state)
@@ -0,0 +1,218 @@
+"""datajournal module
+Author = Richard D. Fears
+Created = 2026-10-17
+Description = Provides the DataJournal class, which appends small change records for the timer
+	data to a log file next to the data file. The log is replayed on top of the snapshot JSON at
+	startup and is periodically compacted back into the snapshot.
+"""
+# Standard Python library imports
+import os, sys, json
+# My code imports
+import helper
+from intervalstore import IntervalStore
+
+class DataJournal:
+	"""DataJournal class
+	Keeps a shadow copy of what has already been persisted for each timer, so that only the
+	differences (new/edited intervals, changed fields, added/removed timers) need to be appended
+	to the journal file.
+	Each line of the journal file is a single JSON record with one of the following ops:
+		add: {'seq':n,'op':'add','timer':index,'data':timerdict}
+		remove: {'seq':n,'op':'remove','timer':index}
+		order: {'seq':n,'op':'order','order':[oldindex,...]}
+		fields: {'seq':n,'op':'fields','timer':index,'fields':{key:value}}
+		splice: {'seq':n,'op':'splice','timer':index,'from':k,'intervals':[...]}
+		meta: {'seq':n,'op':'meta','key':key,'value':value}
+	A splice replaces everything from interval k onwards with the given intervals. A meta record
+	sets a top-level key of the data (other than the timer data itself, e.g. 'next timer id').
+	"""
+
+	def __init__ (self, filename, compactionrecords=500):
+		"""DataJournal constructor
+		filename is the full path of the journal file. compactionrecords is the number of records
+		after which needs_compaction starts returning True.
+		"""
+		self._filename = filename
+		self._compaction_records = compactionrecords
+		# Number of records written/replayed since the last snapshot
+		self._num_records = 0
+		# Sequence number of the last record written/replayed
+		self._sequence = 0
+		# Persisted state for each timer, in the same order as the timer data
+		self._shadow = []
+
+	@property
+	def sequence (self):
+		return self._sequence
+
+	def needs_compaction (self):
+		"""needs_compaction function
+		Returns True if enough records have built up that the journal should be folded into the
+		snapshot.
+		"""
+		return self._num_records >= self._compaction_records
+
+	def replay (self, data):
+		"""replay function
+		Applies all journal records newer than the snapshot's 'journal sequence' to the data dict.
+		Stops at the first unreadable record (e.g. a partial line from a crash).
+		Returns the number of records applied.
+		"""
+		snapshotsequence = data.get('journal sequence',0)
+		self._sequence = snapshotsequence
+		self._num_records = 0
+		try:
+			fileobj = open(self._filename)
+		except:
+			# No journal yet, so nothing to replay
+			return 0
+		with fileobj:
+			for line in fileobj:
+				try:
+					record = json.loads(line)
+					if record['seq'] <= snapshotsequence:
+						continue
+					self._apply_record(data,record)
+				except:
+					# TODO: Switch to debug log
+					print("Stopped replaying "+self._filename+" at a bad record.",file=sys.stderr)
+					break
+				self._sequence = record['seq']
+				self._num_records += 1
+		return self._num_records
+
+	def _apply_record (self, data, record):
+		"""_apply_record internal function
+		Applies a single journal record to the data dict.
+		"""
+		timerdata = data['timerdata']
+		if record['op'] == 'meta':
+			data[record['key']] = record['value']
+		elif record['op'] == 'add':
+			timerdata.insert(record['timer'],record['data'])
+		elif record['op'] == 'remove':
+			del timerdata[record['timer']]
+		elif record['op'] == 'order':
+			timerdata[:] = [timerdata[i] for i in record['order']]
+		elif record['op'] == 'fields':
+			timerdata[record['timer']].update(record['fields'])
+		elif record['op'] == 'splice':
+			intervals = timerdata[record['timer']].setdefault('intervals',[])
+			intervals[record['from']:] = record['intervals']
+		else:
+			raise ValueError("Unknown journal op "+str(record['op']))
+
+	def _shadow_entry (self, timerdict):
+		"""_shadow_entry internal function
+		Builds a copy of a timer dict which will not change when the timer dict changes.
+		"""
+		entry = {'fields':{},'intervals':IntervalStore()}
+		for key,value in timerdict.items():
+			if key == 'intervals':
+				entry['intervals'] = IntervalStore(value)
+			else:
+				entry['fields'][key] = value
+		return entry
+
+	def reset (self, timerdata):
+		"""reset function
+		Marks the given list of timer dicts as fully persisted.
+		"""
+		self._shadow = [self._shadow_entry(timerdict) for timerdict in timerdata]
+
+	def compacted (self, sequence):
+		"""compacted function
+		Called once a snapshot including every record up to the given sequence number has been
+		written. Drops those records from the journal file. As the snapshot may have been written
+		in the background, any newer records are kept.
+		"""
+		try:
+			if sequence >= self._sequence:
+				open(self._filename,'w').close()
+			else:
+				with open(self._filename) as fileobj:
+					lines = [line for line in fileobj if json.loads(line)['seq'] > sequence]
+				with open(self._filename,'w') as fileobj:
+					fileobj.writelines(lines)
+		except:
+			# The snapshot already includes the sequence, so old records will be skipped anyways
+			print("Journal "+self._filename+" could not be truncated.",file=sys.stderr)
+		self._num_records = max(self._sequence-sequence,0)
+
+	def close (self):
+		"""close function
+		Nothing to close, as the journal file is only open while appending.
+		"""
+		pass
+
+	def _append (self, records):
+		"""_append internal function
+		Numbers the given records and appends them to the journal file.
+		"""
+		if len(records) == 0:
+			return
+		lines = []
+		for record in records:
+			self._sequence += 1
+			record['seq'] = self._sequence
+			lines.append(json.dumps(record,separators=(',',':'),default=helper.jsonDefault)+"\n")
+		dirname = os.path.dirname(self._filename)
+		if dirname != '' and not os.path.exists(dirname):
+			os.makedirs(dirname)
+		with open(self._filename,'a') as fileobj:
+			fileobj.writelines(lines)
+		self._num_records += len(records)
+
+	def record_meta (self, key, value):
+		"""record_meta function
+		Records a new value for a top-level key of the data (other than 'timerdata').
+		"""
+		self._append([{'op':'meta','key':key,'value':value}])
+
+	def record_add (self, index, timerdict):
+		"""record_add function
+		Records a timer which was added to the timer data at the given index.
+		"""
+		self._append([{'op':'add','timer':index,'data':timerdict}])
+		self._shadow.insert(index,self._shadow_entry(timerdict))
+
+	def record_remove (self, index):
+		"""record_remove function
+		Records that the timer at the given index was removed from the timer data.
+		"""
+		self._append([{'op':'remove','timer':index}])
+		del self._shadow[index]
+
+	def record_order (self, order):
+		"""record_order function
+		Records that the timer data was reordered. order is the list of old indexes, in their
+		new order.
+		"""
+		self._append([{'op':'order','order':order}])
+		self._shadow[:] = [self._shadow[i] for i in order]
+
+	def record_timer (self, index, timerdict):
+		"""record_timer function
+		Compares the timer at the given index against what was last persisted and appends records
+		for any differences. Intervals are compared from the front, so that the typical change
+		(the last interval being stopped or extended) is a single small splice record.
+		"""
+		records = []
+		shadow = self._shadow[index]
+		# Changed fields
+		fields = {}
+		for key,value in timerdict.items():
+			if key != 'intervals' and (key not in shadow['fields'] or shadow['fields'][key] != value):
+				fields[key] = value
+		if len(fields) > 0:
+			records.append({'op':'fields','timer':index,'fields':fields})
+			shadow['fields'].update(fields)
+		# Changed intervals
+		intervals = timerdict.get('intervals',[])
+		oldintervals = shadow['intervals']
+		first = oldintervals.common_prefix(intervals)
+		if first < len(intervals) or first < len(oldintervals):
+			newtail = [list(interval) for interval in intervals[first:]]
+			records.append({'op':'splice','timer':index,'from':first,'intervals':newtail})
+			oldintervals[first:] = newtail
+		self._append(records)
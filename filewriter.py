@@ -0,0 +1,164 @@
+"""filewriter module
+Author = Richard D. Fears
+Created = 2026-10-17
+Description = Provides the FileWriter class, which writes JSON files from a background thread so
+	that saving large files does not freeze the window.
+"""
+# Standard Python library imports
+import os, json, queue, threading, traceback
+# My code imports
+import helper
+
+class FileWriter:
+	"""FileWriter class
+	Takes a snapshot of each dict to write on the calling (Tk) thread, as that is the only point
+	at which it is safe to read, and hands it to a worker thread, which does the slow part
+	(encoding, encrypting, writing, syncing). The snapshot only copies the containers and interval
+	columns (see helper.jsonSnapshot), so the JSON is only encoded once, off the Tk thread. If a
+	file is queued again before its previous snapshot has been written, only the newest snapshot
+	is written.
+	Each file is written to a temporary file next to it, synced to disk and then renamed over the
+	original, so a crash mid-write never leaves a truncated file behind.
+	Tk may only be used from the main thread, so completions are collected by the worker and
+	picked up by the main thread (with an after() loop which only runs while writes are
+	outstanding), which then calls each write's callback.
+	"""
+
+	# Milliseconds between checks for finished writes
+	POLL_INTERVAL = 50
+	# Suffix of the temporary file each file is written to before replacing the original
+	TEMP_SUFFIX = ".tmp"
+
+	def __init__ (self, widget):
+		"""FileWriter constructor
+		widget is any Tk widget, used for scheduling the after() calls.
+		"""
+		self._widget = widget
+		# Jobs waiting to be written, by filename; the queue only holds the filenames
+		self._pending = {}
+		self._queue = queue.Queue()
+		# Filename currently being written by the worker
+		self._writing = None
+		# (callbacks,success) for each finished job, waiting to be picked up by the main thread
+		self._finished = []
+		self._lock = threading.Condition()
+		self._poller = None
+		self._thread = threading.Thread(target=self._run,name="FileWriter",daemon=True)
+		self._thread.start()
+
+	def write_json (self, filename, sourcedict, wrapperfunc=None, callback=None):
+		"""write_json function
+		Queues sourcedict to be written as JSON to filename (creating the directory if needed),
+		optionally running wrapperfunc on the JSON text first. wrapperfunc is run on the worker
+		thread, so it must not touch any shared state.
+		callback, if given, is called on the main thread with one argument: True if the file was
+		written, False otherwise (including if sourcedict cannot be converted to JSON).
+		"""
+		# Copying is much faster than encoding, and gives the worker a copy nothing else changes
+		snapshot = helper.jsonSnapshot(sourcedict)
+		with self._lock:
+			if filename in self._pending:
+				job = self._pending[filename]
+				job['snapshot'] = snapshot
+				job['wrapperfunc'] = wrapperfunc
+			else:
+				job = {'snapshot':snapshot,'wrapperfunc':wrapperfunc,'callbacks':[]}
+				self._pending[filename] = job
+				self._queue.put(filename)
+			if callback != None:
+				job['callbacks'].append(callback)
+		self._schedule_poll()
+
+	def wait (self, filename=None):
+		"""wait function
+		Blocks until the given file (or, if not given, every file) has no writes outstanding.
+		Callbacks are still called later, from the after() loop.
+		"""
+		with self._lock:
+			while (filename == None and (len(self._pending) > 0 or self._writing != None)) or \
+				(filename != None and (filename in self._pending or self._writing == filename)):
+				self._lock.wait()
+
+	def close (self):
+		"""close function
+		Waits for every outstanding write, stops the worker thread, and then calls any remaining
+		callbacks. Used when shutting down, as the after() loop will no longer run.
+		"""
+		self.wait()
+		self._queue.put(None)
+		self._thread.join()
+		if self._poller != None:
+			self._widget.after_cancel(self._poller)
+			self._poller = None
+		self._call_finished()
+
+	def _run (self):
+		"""_run internal function
+		The worker thread. Writes each queued file until it receives None.
+		"""
+		while True:
+			filename = self._queue.get()
+			if filename == None:
+				return
+			with self._lock:
+				job = self._pending.pop(filename)
+				self._writing = filename
+			success = self._write(filename,job)
+			with self._lock:
+				self._writing = None
+				self._finished.append((job['callbacks'],success))
+				self._lock.notify_all()
+
+	def _write (self, filename, job):
+		"""_write internal function
+		Writes a single job's snapshot out to its file. Returns True if it succeeded.
+		"""
+		try:
+			dirname = os.path.dirname(filename)
+			if dirname != '' and not os.path.exists(dirname):
+				os.makedirs(dirname)
+			text = json.dumps(job['snapshot'],indent="\t",separators=(', ',':'),
+				default=helper.jsonDefault)
+			if job['wrapperfunc'] != None:
+				text = job['wrapperfunc'](text)
+			tempname = filename+self.TEMP_SUFFIX
+			with open(tempname,'w') as fileobj:
+				fileobj.write(text)
+				fileobj.flush()
+				os.fsync(fileobj.fileno())
+			os.replace(tempname,filename)
+			return True
+		# TODO: Switch to debug file
+		except:
+			traceback.print_exc()
+			return False
+
+	def _schedule_poll (self):
+		"""_schedule_poll internal function
+		Starts the after() loop which checks for finished writes, if it is not already running.
+		"""
+		if self._poller == None:
+			self._poller = self._widget.after(self.POLL_INTERVAL,self._poll)
+
+	def _poll (self):
+		"""_poll callback function
+		Calls the callbacks of any finished writes, and keeps checking while any are outstanding.
+		"""
+		self._poller = None
+		self._call_finished()
+		with self._lock:
+			outstanding = len(self._pending) > 0 or self._writing != None or \
+				len(self._finished) > 0
+		if outstanding:
+			self._schedule_poll()
+
+	def _call_finished (self):
+		"""_call_finished internal function
+		Calls the callbacks of every finished write, on the current (main) thread.
+		"""
+		with self._lock:
+			finished = self._finished
+			self._finished = []
+		for callbacks,success in finished:
+			for callback in callbacks:
+				callback(success)
@@ -0,0 +1,79 @@
+"""heartbeat module
+Author = Richard D. Fears
+Created = 2026-10-17
+Description = Provides the Heartbeat class, a tiny fixed-size memory-mapped file which records
+	the running timers every few seconds, so that a crash loses at most a few seconds of time.
+"""
+# Standard Python library imports
+import os, sys, mmap, struct, zlib
+
+class Heartbeat:
+	"""Heartbeat class
+	The file is a header (magic, record count, CRC of the records) followed by space for
+	MAX_RECORDS records of (timer id, interval start, last beat). Each beat overwrites the whole
+	file in place through the memory map, so no file needs to be opened or grown.
+	"""
+
+	MAGIC = b'YHB1'
+	HEADER = struct.Struct('<4sII')
+	RECORD = struct.Struct('<qdd')
+	# Maximum number of running timers which can be recorded
+	MAX_RECORDS = 32
+	SIZE = HEADER.size+MAX_RECORDS*RECORD.size
+
+	def __init__ (self, filename):
+		"""Heartbeat constructor
+		Opens (and creates, if necessary) the heartbeat file at filename. Any records left by the
+		last run are kept until the first beat, so that they can be read with records().
+		"""
+		self._filename = filename
+		dirname = os.path.dirname(filename)
+		if dirname != '' and not os.path.exists(dirname):
+			os.makedirs(dirname)
+		if not os.path.exists(filename):
+			with open(filename,'wb') as fileobj:
+				fileobj.write(self.HEADER.pack(self.MAGIC,0,zlib.crc32(b''))+
+					bytes(self.SIZE-self.HEADER.size))
+		self._fileobj = open(filename,'r+b')
+		if os.path.getsize(filename) < self.SIZE:
+			self._fileobj.truncate(self.SIZE)
+		self._map = mmap.mmap(self._fileobj.fileno(),self.SIZE)
+
+	def records (self):
+		"""records function
+		Returns the list of (timerid,start,beat) records in the file, or an empty list if it is
+		empty or unreadable.
+		"""
+		magic,count,crc = self.HEADER.unpack_from(self._map,0)
+		if magic != self.MAGIC or count > self.MAX_RECORDS:
+			return []
+		body = self._map[self.HEADER.size:self.HEADER.size+count*self.RECORD.size]
+		if zlib.crc32(body) != crc:
+			# TODO: Switch to debug log
+			print("Heartbeat "+self._filename+" is corrupt; ignoring it.",file=sys.stderr)
+			return []
+		return [self.RECORD.unpack_from(body,i*self.RECORD.size) for i in range(count)]
+
+	def beat (self, records):
+		"""beat function
+		Replaces the contents of the file with the given (timerid,start,beat) records. Only the first
+		MAX_RECORDS records are kept.
+		"""
+		records = records[:self.MAX_RECORDS]
+		body = b''.join(self.RECORD.pack(*record) for record in records)
+		header = self.HEADER.pack(self.MAGIC,len(records),zlib.crc32(body))
+		self._map[0:len(header)+len(body)] = header+body
+		self._map.flush()
+
+	def clear (self):
+		"""clear function
+		Records that no timers are running.
+		"""
+		self.beat([])
+
+	def close (self):
+		"""close function
+		Unmaps and closes the heartbeat file.
+		"""
+		self._map.close()
+		self._fileobj.close()
@@ -3,6 +3,8 @@ Author = Richard D. Fears
 Created = 2017-08-22
 Description = Provides some helper functions and constants for use in my other programs.
 """
+# Standard Python library imports
+import time, math, functools, heapq
 PLAY_CHAR=u'\u23F5'
 PAUSE_CHAR=u'\u23F8'
 LEFT_CHAR=u'\u23F4'
@@ -41,6 +43,11 @@ MONTHS=(
 )
 MONTHS_3_LETTER=tuple([MONTHS[i][0] for i in range(len(MONTHS))])
 MONTHS_FULL=tuple([MONTHS[i][1] for i in range(len(MONTHS))])
+# Maximum number of entries in each of the time formatting/parsing caches
+TIME_CACHE_SIZE=4096
+# strftime directives which only depend on the local day or the local minute, respectively
+DAY_DIRECTIVES="aAbBhCdDeFgGjmuUVwWxyY"
+MINUTE_DIRECTIVES="HIklMpRzZ"
 
 def dictFromDefaults (custom, defaults):
 	"""setDictFromDefaults helper function
@@ -83,6 +90,69 @@ def configThemeFromDict (widget, theme, themetype, widgettype):
 		else:
 			widget.configure(theme[themetype][widgettype])
 
+def findOverlaps (timers, include=None):
+	"""findOverlaps helper function
+	Finds every interval which overlaps an interval of a different timer. timers is a list of
+	timer dicts; include, if given, is a function of an interval which returns whether it should
+	be checked at all (e.g. only the intervals about to be exported).
+	The intervals of all timers are swept through in order of start time. An interval overlaps an
+	earlier one of another timer if that timer's latest end so far is after its start, and an
+	earlier interval which has not yet been found to overlap anything is marked (and forgotten)
+	as soon as an interval of another timer starts before it ends. So apart from sorting, each
+	interval takes O(1), and the whole search takes O(N log N) for N intervals.
+	Returns a dict of timer index (in timers) -> sorted list of overlapping interval indexes.
+	"""
+	def timerIntervals (timerindex, intervals):
+		# Each timer's intervals are normally sorted already, which makes this sort O(N)
+		return sorted((interval[0],interval[1],timerindex,i)
+			for i,interval in enumerate(intervals) if include == None or include(interval))
+	overlaps = {}
+	# The latest end of each timer's intervals so far, and the (end,timer index) of the two timers
+	# with the latest ends, one of which has the latest end of any other timer
+	latest = {}
+	best = []
+	# The (end,interval index) of each interval not yet found to overlap anything, by timer index
+	unmarked = {}
+	for start,end,timerindex,i in heapq.merge(*[timerIntervals(timerindex,timer['intervals'])
+		for timerindex,timer in enumerate(timers)]):
+		# Any earlier interval of another timer which ends after this start overlaps this one
+		for othertimer in [othertimer for othertimer in unmarked if othertimer != timerindex]:
+			for otherend,otheri in unmarked.pop(othertimer):
+				if otherend > start:
+					overlaps.setdefault(othertimer,set()).add(otheri)
+		if any(otherend > start for otherend,othertimer in best if othertimer != timerindex):
+			overlaps.setdefault(timerindex,set()).add(i)
+		else:
+			unmarked.setdefault(timerindex,[]).append((end,i))
+		latest[timerindex] = max(latest.get(timerindex,end),end)
+		best = sorted([entry for entry in best if entry[1] != timerindex]+
+			[(latest[timerindex],timerindex)],reverse=True)[:2]
+	return {timerindex:sorted(indexes) for timerindex,indexes in overlaps.items()}
+
+def jsonDefault (obj):
+	"""jsonDefault helper function
+	Used as the default function for json.dump(s), so that objects which hold their data in a more
+	compact form (e.g. IntervalStore) are written as their plain JSON equivalent (from to_json).
+	"""
+	if hasattr(obj,'to_json'):
+		return obj.to_json()
+	raise TypeError("Object of type "+type(obj).__name__+" is not JSON serializable")
+
+def jsonSnapshot (obj):
+	"""jsonSnapshot helper function
+	Returns a copy of obj (anything json.dump(s) can write, using jsonDefault) which will not
+	change when obj does, so that it can be encoded later on another thread. Objects written with
+	to_json (e.g. IntervalStore) are copied with their copy function, which is much faster than
+	encoding them; strings and numbers cannot change, so they are shared.
+	"""
+	if isinstance(obj,dict):
+		return {key:jsonSnapshot(value) for key,value in obj.items()}
+	if isinstance(obj,(list,tuple)):
+		return [jsonSnapshot(value) for value in obj]
+	if hasattr(obj,'to_json'):
+		return obj.copy()
+	return obj
+
 def dictVersionUpdate (olddict, dictversionupdate, defaultdict):
 	"""dictVersionUpdate helper function
 	A wrapper which handles calling the version update function at the appropriate time.
@@ -100,3 +170,95 @@ def dictVersionUpdate (olddict, dictversionupdate, defaultdict):
 	olddict = dictFromDefaults(olddict,defaultdict)
 	# And return the updated dict
 	return olddict
+
+@functools.lru_cache(maxsize=None)
+def _splitTimeFormat (timeformat):
+	"""_splitTimeFormat helper function
+	Splits a strftime format into a tuple of (level,format) segments, where level is 'day',
+	'minute' or 'second' depending on what the segment's directives change with. Literal text
+	goes with whatever segment it is next to.
+	"""
+	segments = []
+	i = 0
+	while i < len(timeformat):
+		if timeformat[i] == '%' and i+1 < len(timeformat):
+			directive = timeformat[i:i+2]
+			i += 2
+		else:
+			directive = timeformat[i]
+			i += 1
+		if len(directive) == 1 or directive == '%%':
+			level = segments[-1][0] if len(segments) > 0 else 'day'
+		elif directive[1] in DAY_DIRECTIVES:
+			level = 'day'
+		elif directive[1] in MINUTE_DIRECTIVES:
+			level = 'minute'
+		else:
+			level = 'second'
+		if len(segments) > 0 and segments[-1][0] == level:
+			segments[-1][1] += directive
+		else:
+			segments.append([level,directive])
+	return tuple((level,segment) for level,segment in segments)
+
+@functools.lru_cache(maxsize=TIME_CACHE_SIZE)
+def _localMinute (minute):
+	"""_localMinute helper function
+	Returns the local struct_time for the start of the given minute (Unixtime/60).
+	"""
+	return time.localtime(minute*60)
+
+@functools.lru_cache(maxsize=TIME_CACHE_SIZE)
+def _formatDay (timeformat, year, month, day):
+	"""_formatDay helper function
+	Formats a day-level format segment for the given local date.
+	"""
+	# Use midday, so that DST changes cannot move us onto another day
+	return time.strftime(timeformat,time.localtime(time.mktime((year,month,day,12,0,0,0,0,-1))))
+
+@functools.lru_cache(maxsize=TIME_CACHE_SIZE)
+def _formatMinute (timeformat, minute):
+	"""_formatMinute helper function
+	Formats a minute-level format segment for the given minute (Unixtime/60).
+	"""
+	return time.strftime(timeformat,_localMinute(minute))
+
+def formatLocalTime (timeformat, timestamp):
+	"""formatLocalTime helper function
+	Equivalent to time.strftime(timeformat,time.localtime(timestamp)), but the parts of the
+	format which only depend on the date are cached per local day, and the parts which only
+	depend on the hour/minute are cached per minute. Assumes the timezone does not change while
+	running (see clearTimeCaches).
+	"""
+	minute,second = divmod(math.floor(timestamp),60)
+	localminute = _localMinute(minute)
+	parts = []
+	for level,segment in _splitTimeFormat(timeformat):
+		if level == 'day':
+			parts.append(_formatDay(segment,localminute.tm_year,localminute.tm_mon,
+				localminute.tm_mday))
+		elif level == 'minute':
+			parts.append(_formatMinute(segment,minute))
+		elif segment == '%S':
+			parts.append("{:02d}".format(second))
+		else:
+			parts.append(time.strftime(segment,time.localtime(timestamp)))
+	return "".join(parts)
+
+@functools.lru_cache(maxsize=TIME_CACHE_SIZE)
+def parseLocalTime (text, timeformat):
+	"""parseLocalTime helper function
+	Equivalent to time.mktime(time.strptime(text,timeformat)), but cached, as the same strings
+	tend to be parsed over and over (e.g. every row of a table on each save). Raises ValueError
+	if the text does not match the format.
+	"""
+	return time.mktime(time.strptime(text,timeformat))
+
+def clearTimeCaches ():
+	"""clearTimeCaches helper function
+	Empties the formatLocalTime/parseLocalTime caches, e.g. after the timezone changes.
+	"""
+	_localMinute.cache_clear()
+	_formatDay.cache_clear()
+	_formatMinute.cache_clear()
+	parseLocalTime.cache_clear()
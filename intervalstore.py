@@ -0,0 +1,496 @@
+"""intervalstore module
+Author = Richard D. Fears
+Created = 2026-10-17
+Description = Provides the IntervalStore class, a compact column-based replacement for a timer's
+	list of [start,end,exported,description] intervals.
+"""
+# Standard Python library imports
+import operator, itertools, bisect
+from array import array
+from collections.abc import MutableSequence
+
+# Every description is stored once, and intervals only hold its index in this table. The table
+# is shared by all stores, so the same description on many timers is only stored once, and
+# description indexes can be compared between stores.
+_descriptions = [""]
+_description_ids = {"":0}
+# Maps exported flags to unexported flags, for selecting unexported intervals
+_UNEXPORTED = bytes([1])+bytes(255)
+
+def _description_id (description):
+	"""_description_id internal function
+	Returns the index of the description in the shared table, adding it if necessary.
+	"""
+	description = str(description)
+	if description not in _description_ids:
+		_description_ids[description] = len(_descriptions)
+		_descriptions.append(description)
+	return _description_ids[description]
+
+class IntervalRow:
+	"""IntervalRow class
+	A view of a single interval in an IntervalStore, which can be used just like the old
+	[start,end,exported,description] lists (interval[1] = time.time(), etc.); reads and writes go
+	straight through to the store. A row keeps referring to the same interval when the store is
+	sorted or other rows are added/removed.
+	Rows compare equal to any sequence with the same values, but are not the same object each
+	time they are fetched, so use same_row rather than "is" to check for the same interval.
+	"""
+
+	__slots__ = ('_store','_index','_rowid')
+	# Rows are mutable, and compare by value, just like lists
+	__hash__ = None
+
+	def __init__ (self, store, index):
+		"""IntervalRow constructor
+		Only created by IntervalStore.
+		"""
+		self._store = store
+		self._index = index
+		self._rowid = store._rowids[index]
+
+	@property
+	def index (self):
+		"""The row's current index in its store. Raises IndexError if it has been deleted."""
+		rowids = self._store._rowids
+		if self._index >= len(rowids) or rowids[self._index] != self._rowid:
+			try:
+				self._index = rowids.index(self._rowid)
+			except ValueError:
+				raise IndexError("interval has been deleted from its store")
+		return self._index
+
+	@property
+	def deleted (self):
+		"""True if the interval has been removed from its store."""
+		try:
+			self.index
+			return False
+		except IndexError:
+			return True
+
+	def same_row (self, other):
+		"""same_row function
+		Returns True if other is a row referring to the same interval of the same store.
+		"""
+		return isinstance(other,IntervalRow) and other._store is self._store and \
+			other._rowid == self._rowid
+
+	def __len__ (self):
+		return 4
+
+	def __getitem__ (self, column):
+		if isinstance(column,slice):
+			return list(self)[column]
+		return self._store._get(self.index,column)
+
+	def __setitem__ (self, column, value):
+		self._store._set(self.index,column,value)
+
+	def __iter__ (self):
+		index = self.index
+		return iter([self._store._get(index,column) for column in range(4)])
+
+	def __eq__ (self, other):
+		if isinstance(other,(IntervalRow,list,tuple)):
+			return list(self) == list(other)
+		return NotImplemented
+
+	def __lt__ (self, other):
+		if isinstance(other,(IntervalRow,list,tuple)):
+			return list(self) < list(other)
+		return NotImplemented
+
+	def __repr__ (self):
+		return repr(list(self))
+
+class IntervalStore (MutableSequence):
+	"""IntervalStore class
+	Holds a timer's intervals as columns: start and end times in double arrays, the exported
+	flags in a bytearray, and the descriptions as indexes into a shared table of descriptions.
+	That is around 30 bytes per interval, instead of a list, two floats and their pointers.
+	Indexing returns an IntervalRow (or, for slices, plain lists), and rows can be added as any
+	4-item sequence, so the store can be used in place of the old list of lists. to_json returns
+	the old list of lists, for writing out.
+	"""
+
+	def __init__ (self, rows=()):
+		"""IntervalStore constructor
+		rows is any iterable of [start,end,exported,description] sequences (e.g. the intervals
+		read from the data file).
+		"""
+		self._starts = array('d')
+		self._ends = array('d')
+		self._exported = bytearray()
+		self._descriptions = array('L')
+		# A unique id for each row, so that IntervalRows can find their row again
+		self._rowids = array('L')
+		self._next_rowid = 0
+		self._listener = None
+		# The row whose end changes are not reported (see set_quiet_row), and its span as last
+		# reported to the listener
+		self._quiet_rowid = None
+		self._quiet_span = None
+		self.extend(rows)
+
+	def set_listener (self, listener):
+		"""set_listener function
+		Registers a function which is called whenever an interval is added, changed or removed,
+		with two arguments: the old and the new (start,end,exported) of the interval, the first
+		of which is None for added intervals and the second None for removed ones. Only one
+		listener is kept; None removes it. Sorting does not change any intervals, so it is not
+		reported, and neither are end changes of the quiet row until it is flushed.
+		"""
+		self._listener = listener
+
+	def set_quiet_row (self, row):
+		"""set_quiet_row function
+		Stops reporting changes to the end of the given IntervalRow (e.g. the interval being
+		timed, which is extended every tick), until the quiet row is changed again. Any end
+		changes of the previous quiet row are reported first (see flush). None just ends it.
+		"""
+		self.flush()
+		if row != None:
+			self._quiet_rowid = row._rowid
+			self._quiet_span = self._span(row.index)
+		else:
+			self._quiet_rowid = None
+			self._quiet_span = None
+
+	def flush (self):
+		"""flush function
+		Reports any unreported end changes of the quiet row to the listener.
+		"""
+		if self._quiet_rowid == None:
+			return
+		span = self._span(self._rowids.index(self._quiet_rowid))
+		if span != self._quiet_span:
+			old,self._quiet_span = self._quiet_span,span
+			if self._listener != None:
+				self._listener(old,span)
+
+	def _reported_span (self, index):
+		"""_reported_span internal function
+		Returns the (start,end,exported) of the row at index as last reported to the listener,
+		which for the quiet row may be older than its current one.
+		"""
+		if self._rowids[index] == self._quiet_rowid:
+			return self._quiet_span
+		return self._span(index)
+
+	def _report (self, old, index):
+		"""_report internal function
+		Reports a change of the row at index from old to the listener.
+		"""
+		new = self._span(index)
+		if self._rowids[index] == self._quiet_rowid:
+			self._quiet_span = new
+		if self._listener != None:
+			self._listener(old,new)
+
+	def _report_removed (self, removed, rowids):
+		"""_report_removed internal function
+		Reports removed rows (as their last reported spans) to the listener.
+		"""
+		if self._quiet_rowid in rowids:
+			self._quiet_rowid = None
+			self._quiet_span = None
+		if self._listener != None:
+			for span in removed:
+				self._listener(span,None)
+
+	def _span (self, index):
+		"""_span internal function
+		Returns the (start,end,exported) of the row at index, as passed to the listener.
+		"""
+		return (self._starts[index],self._ends[index],bool(self._exported[index]))
+
+	def spans (self):
+		"""spans function
+		Returns an iterator of (start,end,exported) for every interval, without building any
+		IntervalRows.
+		"""
+		return zip(self._starts,self._ends,map(bool,self._exported))
+
+	def _get (self, index, column):
+		"""_get internal function
+		Returns a single value from the row at index.
+		"""
+		if column < 0:
+			column += 4
+		if column == 0:
+			return self._starts[index]
+		elif column == 1:
+			return self._ends[index]
+		elif column == 2:
+			return bool(self._exported[index])
+		elif column == 3:
+			return _descriptions[self._descriptions[index]]
+		raise IndexError("interval column out of range")
+
+	def _set (self, index, column, value):
+		"""_set internal function
+		Sets a single value in the row at index.
+		"""
+		if column < 0:
+			column += 4
+		if column == 1 and self._rowids[index] == self._quiet_rowid:
+			self._set_value(index,column,value)
+		elif column in (0,1,2):
+			old = self._reported_span(index)
+			self._set_value(index,column,value)
+			self._report(old,index)
+		else:
+			self._set_value(index,column,value)
+
+	def _set_value (self, index, column, value):
+		"""_set_value internal function
+		Does the actual work for _set.
+		"""
+		if column == 0:
+			self._starts[index] = value
+		elif column == 1:
+			self._ends[index] = value
+		elif column == 2:
+			self._exported[index] = 1 if value else 0
+		elif column == 3:
+			self._descriptions[index] = _description_id(value)
+		else:
+			raise IndexError("interval column out of range")
+
+	def _index (self, index):
+		"""_index internal function
+		Converts a (possibly negative) index to a positive one, raising IndexError if it is out
+		of range.
+		"""
+		if index < 0:
+			index += len(self._starts)
+		if index < 0 or index >= len(self._starts):
+			raise IndexError("interval index out of range")
+		return index
+
+	def __len__ (self):
+		return len(self._starts)
+
+	def __getitem__ (self, index):
+		if isinstance(index,slice):
+			return [list(self[i]) for i in range(*index.indices(len(self)))]
+		return IntervalRow(self,self._index(index))
+
+	def __iter__ (self):
+		for index in range(len(self._starts)):
+			yield IntervalRow(self,index)
+
+	def __setitem__ (self, index, value):
+		if isinstance(index,slice):
+			start,stop,step = index.indices(len(self))
+			if step != 1:
+				raise ValueError("interval slices must be contiguous")
+			rows = [list(row) for row in value]
+			del self[start:max(stop,start)]
+			for i,row in enumerate(rows):
+				self.insert(start+i,row)
+			return
+		index = self._index(index)
+		start,end,exported,description = self._unpack(value)
+		old = self._reported_span(index)
+		self._starts[index] = start
+		self._ends[index] = end
+		self._exported[index] = exported
+		self._descriptions[index] = description
+		self._report(old,index)
+
+	def __delitem__ (self, index):
+		if isinstance(index,slice):
+			indexes = range(*index.indices(len(self)))
+		else:
+			index = self._index(index)
+			indexes = [index]
+		removed = [self._reported_span(i) for i in indexes]
+		rowids = [self._rowids[i] for i in indexes]
+		for column in self._columns():
+			del column[index]
+		self._report_removed(removed,rowids)
+
+	def insert (self, index, value):
+		"""insert function
+		Inserts a [start,end,exported,description] row before index.
+		"""
+		if index < 0:
+			index = max(index+len(self),0)
+		index = min(index,len(self))
+		start,end,exported,description = self._unpack(value)
+		self._starts.insert(index,start)
+		self._ends.insert(index,end)
+		self._exported.insert(index,exported)
+		self._descriptions.insert(index,description)
+		self._rowids.insert(index,self._next_rowid)
+		self._next_rowid += 1
+		if self._listener != None:
+			self._listener(None,self._span(index))
+
+	@staticmethod
+	def _unpack (row):
+		"""_unpack internal function
+		Converts a row (any sequence) into the values stored in each column. Missing values are
+		filled in from an empty, unexported interval.
+		"""
+		row = list(row)+[0.0,0.0,False,""][len(row):]
+		return float(row[0]),float(row[1]),1 if row[2] else 0,_description_id(row[3])
+
+	def _columns (self):
+		"""_columns internal function
+		Returns every column array, in the same order, including the row ids.
+		"""
+		return (self._starts,self._ends,self._exported,self._descriptions,self._rowids)
+
+	def _sort_key (self, index):
+		"""_sort_key internal function
+		Returns the key which the row at index is sorted by (the same order as the old lists).
+		"""
+		return (self._starts[index],self._ends[index],self._exported[index],
+			_descriptions[self._descriptions[index]])
+
+	def insert_sorted (self, value):
+		"""insert_sorted function
+		Inserts a [start,end,exported,description] row where it belongs in a sorted store (using
+		a binary search on the start times), and returns its IntervalRow.
+		"""
+		start,end,exported,description = self._unpack(value)
+		index = bisect.bisect_left(self._starts,start)
+		last = bisect.bisect_right(self._starts,start,index)
+		# Rows with the same start are ordered by the rest of the row
+		key = (start,end,exported,_descriptions[description])
+		while index < last and self._sort_key(index) <= key:
+			index += 1
+		self.insert(index,value)
+		return IntervalRow(self,index)
+
+	def find_start (self, start):
+		"""find_start function
+		Returns the index of the last interval starting at or before start, or -1 if there is
+		none. The store must be sorted.
+		"""
+		return bisect.bisect_right(self._starts,start)-1
+
+	def is_sorted (self):
+		"""is_sorted function
+		Returns True if the start times are strictly increasing, in which case the store is
+		definitely sorted. This only compares the start column, so it is fast.
+		"""
+		return all(map(operator.lt,self._starts,itertools.islice(self._starts,1,None)))
+
+	def sort (self):
+		"""sort function
+		Sorts the intervals the same way as the old lists (by start, end, exported and then
+		description). Existing IntervalRows follow their intervals. Returns True if anything moved.
+		Intervals are kept sorted as they are added (see insert_sorted), so this is normally only
+		the quick is_sorted check.
+		"""
+		if self.is_sorted():
+			return False
+		starts,ends,exported,descriptions = self._starts,self._ends,self._exported, \
+			self._descriptions
+		order = sorted(range(len(starts)),key=lambda i: (starts[i],ends[i],exported[i],
+			_descriptions[descriptions[i]]))
+		if order == list(range(len(starts))):
+			return False
+		self._starts = array('d',[starts[i] for i in order])
+		self._ends = array('d',[ends[i] for i in order])
+		self._exported = bytearray(exported[i] for i in order)
+		self._descriptions = array('L',[descriptions[i] for i in order])
+		self._rowids = array('L',[self._rowids[i] for i in order])
+		return True
+
+	def delete_rows (self, indexes):
+		"""delete_rows function
+		Deletes all of the rows at the given indexes at once. Existing IntervalRows for the
+		remaining rows follow their intervals.
+		"""
+		indexes = set(self._index(index) for index in indexes)
+		if len(indexes) == 0:
+			return
+		removed = [self._reported_span(index) for index in indexes]
+		rowids = [self._rowids[index] for index in indexes]
+		keep = [i not in indexes for i in range(len(self))]
+		self._starts = array('d',itertools.compress(self._starts,keep))
+		self._ends = array('d',itertools.compress(self._ends,keep))
+		self._exported = bytearray(itertools.compress(self._exported,keep))
+		self._descriptions = array('L',itertools.compress(self._descriptions,keep))
+		self._rowids = array('L',itertools.compress(self._rowids,keep))
+		self._report_removed(removed,rowids)
+
+	def total (self, unexportedonly=False, skip=None):
+		"""total function
+		Returns the sum of every interval's duration (end-start), or only the unexported ones.
+		skip is the index of an interval to leave out (e.g. the one being timed).
+		"""
+		durations = map(operator.sub,self._ends,self._starts)
+		if unexportedonly:
+			total = sum(itertools.compress(durations,self._exported.translate(_UNEXPORTED)))
+		else:
+			total = sum(durations)
+		if skip != None and (not unexportedonly or not self._exported[skip]):
+			total -= self._ends[skip]-self._starts[skip]
+		return total
+
+	def last_end (self, skip=None):
+		"""last_end function
+		Returns the latest end time of any interval, or None if there are none. skip is the index
+		of an interval to leave out.
+		"""
+		if skip == None:
+			ends = self._ends
+		else:
+			ends = self._ends[:skip]+self._ends[skip+1:]
+		return max(ends) if len(ends) > 0 else None
+
+	def common_prefix (self, other):
+		"""common_prefix function
+		Returns how many intervals at the start of this store are the same as those at the start
+		of other (another store, or any sequence of intervals).
+		"""
+		count = min(len(self),len(other))
+		if isinstance(other,IntervalStore):
+			# Compare whole columns first, as nearly every comparison is of a store against a copy
+			# which only differs at the end
+			if self._starts[:count] == other._starts[:count] and \
+				self._ends[:count] == other._ends[:count] and \
+				self._exported[:count] == other._exported[:count] and \
+				self._descriptions[:count] == other._descriptions[:count]:
+				return count
+			for i in range(count):
+				if self._starts[i] != other._starts[i] or self._ends[i] != other._ends[i] or \
+					self._exported[i] != other._exported[i] or \
+					self._descriptions[i] != other._descriptions[i]:
+					return i
+			return count
+		for i in range(count):
+			if self[i] != other[i]:
+				return i
+		return count
+
+	def copy (self):
+		"""copy function
+		Returns a new store with the same intervals (but no listener), by copying the columns.
+		"""
+		store = IntervalStore()
+		store._starts = array('d',self._starts)
+		store._ends = array('d',self._ends)
+		store._exported = bytearray(self._exported)
+		store._descriptions = array('L',self._descriptions)
+		store._rowids = array('L',self._rowids)
+		store._next_rowid = self._next_rowid
+		return store
+
+	def to_json (self):
+		"""to_json function
+		Returns the intervals as the old list of [start,end,exported,description] lists, which is
+		also how they are written to the data file.
+		"""
+		return [[start,end,bool(exported),_descriptions[description]]
+			for start,end,exported,description in
+				zip(self._starts,self._ends,self._exported,self._descriptions)]
+
+	def __repr__ (self):
+		return "IntervalStore("+repr(self.to_json())+")"
@@ -0,0 +1,199 @@
+"""rollupcache module
+Author = Richard D. Fears
+Created = 2026-10-17
+Description = Provides the RollupCache class, which keeps each timer's total time per local date,
+	so that daily and weekly totals do not need to walk every interval.
+"""
+# Standard Python library imports
+import sys, json, time, datetime
+# My code imports
+import helper
+from versionexception import VersionException
+
+class RollupCache:
+	"""RollupCache class
+	Keeps the count, total seconds and unexported seconds of each timer's intervals for each local
+	date. Like the CSV export summaries, an interval counts towards the date it starts on.
+	The totals are updated as each interval changes (see IntervalStore.set_listener), and saved
+	next to the data file. The interval being timed is not reported on every tick (see
+	IntervalStore.set_quiet_row); it is folded in when it is closed, or when the totals are read
+	or saved, so a running timer alone never marks the cache changed.
+	Only the "View Daily Totals" window reads these totals; the CSV export still works from the
+	intervals themselves. When a timer is attached, its saved totals are only used if its
+	intervals still have the saved count and sums (which they will not after a crash, for
+	example); otherwise they are rebuilt from the intervals.
+	"""
+
+	DATE_FORMAT = '%Y-%m-%d'
+	OLDEST_CONVERTIBLE_CACHE_VERSION = [1,0,0]
+	DEFAULT_CACHE = {
+		'version':[1,0,0],
+		# The local timezone which the dates were worked out in
+		'timezone':[],
+		# {timer id:{'check':[count,total,unexported],'days':{date:[count,total,unexported]}}}
+		'timers':{},
+	}
+
+	def _cache_version_update (self, oldcache):
+		"""_cache_version_update internal function
+		Updates the old cache to the new format, based on relative versions.
+		"""
+		# Check for versions which are incompatible with list-of-numbers versions
+		try:
+			oldcache['version'] < [0]
+		except:
+			raise VersionException(VersionException.BAD_TYPE,oldcache['version'])
+
+		# If the cache version is later than the program version, we will not know how to convert
+		if oldcache['version'] > RollupCache.DEFAULT_CACHE['version']:
+			raise VersionException(VersionException.TOO_NEW,
+				oldcache['version'],RollupCache.DEFAULT_CACHE['version'])
+
+		# If the old version is too old, we will not know how to convert
+		if oldcache['version'] < RollupCache.OLDEST_CONVERTIBLE_CACHE_VERSION:
+			raise VersionException(VersionException.TOO_OLD,
+				oldcache['version'],RollupCache.DEFAULT_CACHE['version'])
+
+		# Finally, convert incrementally through all the versions
+		# Below is some sample code to copy:
+		#if oldcache['version'] < [1,1]:
+		#	oldcache['somevariable'] = oldcache['oldvariable']
+		#	oldcache['version'] = [1,1]
+
+	def __init__ (self, filename):
+		"""RollupCache constructor
+		Reads the saved totals from filename, if they exist and were worked out in the current
+		timezone. The cache can always be rebuilt, so anything unreadable is simply ignored.
+		"""
+		# Whether anything has changed since the last snapshot
+		self.changed = False
+		# The totals and IntervalStore of each attached timer, by timer id
+		self._days = {}
+		self._stores = {}
+		try:
+			with open(filename) as fileobj:
+				cache = helper.dictVersionUpdate(json.load(fileobj),self._cache_version_update,
+					self.DEFAULT_CACHE)
+			if cache['timezone'] != self._timezone():
+				raise ValueError("timezone changed")
+			self._saved = {int(timerid):entry for timerid,entry in cache['timers'].items()}
+		# TODO: Switch to debug log
+		except:
+			print("No usable "+filename+" file found. Rebuilding daily totals.",file=sys.stderr)
+			self._saved = {}
+			self.changed = True
+
+	@staticmethod
+	def _timezone ():
+		"""_timezone internal function
+		Returns a JSON-compatible description of the local timezone.
+		"""
+		return [time.timezone,time.altzone,list(time.tzname)]
+
+	@staticmethod
+	def _check (intervals):
+		"""_check internal function
+		Returns the [count,total,unexported] of an IntervalStore, which the saved totals must
+		match to be used.
+		"""
+		return [len(intervals),intervals.total(),intervals.total(unexportedonly=True)]
+
+	def attach (self, timerid, intervals):
+		"""attach function
+		Starts keeping totals for the given timer id's IntervalStore, using the saved totals if
+		they still match the intervals.
+		"""
+		saved = self._saved.pop(timerid,None)
+		if saved != None and saved['check'] == self._check(intervals):
+			days = saved['days']
+		else:
+			days = {}
+			for span in intervals.spans():
+				self._add_span(days,span,1)
+			self.changed = True
+		self._days[timerid] = days
+		self._stores[timerid] = intervals
+		intervals.set_listener(lambda old,new,self=self,timerid=timerid:
+			self._interval_changed(timerid,old,new))
+
+	def detach (self, timerid):
+		"""detach function
+		Stops keeping totals for the given timer id (e.g. once it has been archived), and drops
+		its totals.
+		"""
+		if timerid in self._stores:
+			self._stores.pop(timerid).set_listener(None)
+			del self._days[timerid]
+			self.changed = True
+
+	def _interval_changed (self, timerid, old, new):
+		"""_interval_changed callback function
+		Moves an interval's time from its old (start,end,exported) to its new one.
+		"""
+		days = self._days[timerid]
+		if old != None:
+			self._add_span(days,old,-1)
+		if new != None:
+			self._add_span(days,new,1)
+		self.changed = True
+
+	def _flush (self):
+		"""_flush internal function
+		Folds the latest end of any interval being timed into the totals.
+		"""
+		for intervals in self._stores.values():
+			intervals.flush()
+
+	def _add_span (self, days, span, sign):
+		"""_add_span internal function
+		Adds (sign=1) or removes (sign=-1) a single (start,end,exported) to the day it starts on.
+		"""
+		start,end,exported = span
+		date = helper.formatLocalTime(self.DATE_FORMAT,start)
+		entry = days.setdefault(date,[0,0.0,0.0])
+		entry[0] += sign
+		entry[1] += sign*(end-start)
+		if not exported:
+			entry[2] += sign*(end-start)
+		# Drop days with no intervals left, rather than keeping rounding errors around
+		if entry[0] <= 0:
+			del days[date]
+
+	def day_totals (self, timerid=None, first=None, last=None, unexportedonly=False):
+		"""day_totals function
+		Returns a dict of date (DATE_FORMAT) -> total seconds, for the given timer id (or all
+		timers), for each date from first to last inclusive that has any time. first/last are
+		DATE_FORMAT strings, or None for no limit.
+		"""
+		self._flush()
+		totals = {}
+		for days in ([self._days[timerid]] if timerid != None else self._days.values()):
+			for date,entry in days.items():
+				if (first == None or date >= first) and (last == None or date <= last):
+					totals[date] = totals.get(date,0)+entry[2 if unexportedonly else 1]
+		return totals
+
+	def week_totals (self, timerid=None, first=None, last=None, unexportedonly=False):
+		"""week_totals function
+		Returns a dict of week -> total seconds, like day_totals. Each week is given by the date
+		of its Sunday (the first day of the week in helper.WEEKDAYS).
+		"""
+		totals = {}
+		for date,total in self.day_totals(timerid,first,last,unexportedonly).items():
+			day = datetime.datetime.strptime(date,self.DATE_FORMAT).date()
+			week = (day-datetime.timedelta(days=(day.weekday()+1)%7)).strftime(self.DATE_FORMAT)
+			totals[week] = totals.get(week,0)+total
+		return totals
+
+	def snapshot (self):
+		"""snapshot function
+		Returns the cache as a dict for writing out (see the constructor). Clears changed.
+		"""
+		self._flush()
+		self.changed = False
+		return {
+			'version':self.DEFAULT_CACHE['version'],
+			'timezone':self._timezone(),
+			'timers':{str(timerid):{'check':self._check(self._stores[timerid]),'days':days}
+				for timerid,days in self._days.items()},
+		}
@@ -0,0 +1,247 @@
+"""sqlitedatastore module
+Author = Richard D. Fears
+Created = 2026-10-17
+Description = Provides the SQLiteDataStore class, which stores the timer data in an SQLite
+	database instead of a JSON snapshot, and supports indexed queries over the intervals.
+"""
+# Standard Python library imports
+import os, json, sqlite3
+# My code imports
+from datajournal import DataJournal
+
+class SQLiteDataStore (DataJournal):
+	"""SQLiteDataStore class
+	Uses the same change records as DataJournal, but instead of appending them to a log file,
+	applies each one directly to the timers and intervals tables. As such, there is never any
+	need for compaction.
+	Timers and intervals both have a position column, which is their index in the timer data
+	list and the timer's intervals list, respectively. Every other top-level key of the data
+	(version, 'next timer id', etc.) is a row of the meta table.
+	The queries (interval_summaries, interval_positions and query_intervals) only see what has
+	been recorded, so any changes must be recorded before querying.
+	"""
+
+	# Data file extensions which should be stored with this class
+	EXTENSIONS = ('.db','.sqlite','.sqlite3')
+	# Timer keys which get their own column; everything else is stored as JSON in 'fields'
+	TIMER_COLUMNS = (
+		('title','title'),
+		('description','description'),
+		('source system','source_system'),
+	)
+	SCHEMA = """
+		CREATE TABLE IF NOT EXISTS meta (
+			key TEXT PRIMARY KEY,
+			value TEXT
+		);
+		CREATE TABLE IF NOT EXISTS timers (
+			id INTEGER PRIMARY KEY,
+			position INTEGER NOT NULL,
+			title TEXT,
+			description TEXT,
+			source_system TEXT,
+			fields TEXT
+		);
+		CREATE TABLE IF NOT EXISTS intervals (
+			timer INTEGER NOT NULL REFERENCES timers(id),
+			position INTEGER NOT NULL,
+			start REAL,
+			end REAL,
+			exported INTEGER,
+			description TEXT,
+			PRIMARY KEY (timer,position)
+		);
+		CREATE INDEX IF NOT EXISTS intervals_timer_start ON intervals (timer,start);
+		CREATE INDEX IF NOT EXISTS intervals_timer_end ON intervals (timer,end);
+		CREATE INDEX IF NOT EXISTS intervals_exported ON intervals (exported,timer);
+	"""
+
+	@classmethod
+	def handles (cls, filename):
+		"""handles class function
+		Returns True if the given data filename should be stored in SQLite.
+		"""
+		return filename.lower().endswith(cls.EXTENSIONS)
+
+	def __init__ (self, filename):
+		"""SQLiteDataStore constructor
+		Opens (and creates, if necessary) the database at filename.
+		"""
+		super().__init__(filename)
+		dirname = os.path.dirname(filename)
+		if dirname != '' and not os.path.exists(dirname):
+			os.makedirs(dirname)
+		self._db = sqlite3.connect(filename)
+		self._db.executescript(self.SCHEMA)
+		# Database id for each timer, in the same order as the timer data
+		self._timer_ids = []
+
+	def needs_compaction (self):
+		"""needs_compaction function
+		The database is always up-to-date, so it never needs to be folded into a snapshot.
+		"""
+		return False
+
+	def compacted (self, sequence):
+		"""compacted function
+		Nothing to empty, as there is no journal file.
+		"""
+		pass
+
+	def load (self):
+		"""load function
+		Reads the whole database into a data dict (the same format as the JSON data file).
+		"""
+		data = {'timerdata':[]}
+		# Every other top-level key of the data is kept in the meta table
+		for key,value in self._db.execute("SELECT key,value FROM meta"):
+			data[key] = json.loads(value)
+		self._timer_ids = []
+		timerrows = self._db.execute("SELECT id,title,description,source_system,fields "+
+			"FROM timers ORDER BY position")
+		for timerrow in timerrows.fetchall():
+			timerdict = json.loads(timerrow[4]) if timerrow[4] else {}
+			for i,(key,column) in enumerate(self.TIMER_COLUMNS):
+				if timerrow[i+1] != None:
+					timerdict[key] = timerrow[i+1]
+			timerdict['intervals'] = [
+				[start,end,bool(exported),description]
+				for start,end,exported,description in self._db.execute(
+					"SELECT start,end,exported,description FROM intervals "+
+					"WHERE timer=? ORDER BY position",(timerrow[0],))
+			]
+			data['timerdata'].append(timerdict)
+			self._timer_ids.append(timerrow[0])
+		return data
+
+	def import_timers (self, timerdata):
+		"""import_timers function
+		Adds every timer dict in the list to the (empty) database in a single transaction, e.g.
+		when switching from a JSON data file.
+		"""
+		self._append([{'op':'add','timer':index,'data':timerdict}
+			for index,timerdict in enumerate(timerdata)])
+		self.reset(timerdata)
+
+	def _append (self, records):
+		"""_append internal function
+		Applies the given change records to the database in a single transaction.
+		"""
+		with self._db:
+			for record in records:
+				self._apply_sql_record(record)
+
+	def _apply_sql_record (self, record):
+		"""_apply_sql_record internal function
+		Applies a single change record to the database.
+		"""
+		if record['op'] == 'meta':
+			self._db.execute("INSERT OR REPLACE INTO meta (key,value) VALUES (?,?)",
+				(record['key'],json.dumps(record['value'])))
+		elif record['op'] == 'add':
+			self._db.execute("UPDATE timers SET position=position+1 WHERE position>=?",
+				(record['timer'],))
+			cursor = self._db.execute("INSERT INTO timers (position) VALUES (?)",
+				(record['timer'],))
+			self._timer_ids.insert(record['timer'],cursor.lastrowid)
+			fields = dict(record['data'])
+			intervals = fields.pop('intervals',[])
+			self._update_fields(record['timer'],fields)
+			self._splice_intervals(record['timer'],0,intervals)
+		elif record['op'] == 'remove':
+			timerid = self._timer_ids.pop(record['timer'])
+			self._db.execute("DELETE FROM intervals WHERE timer=?",(timerid,))
+			self._db.execute("DELETE FROM timers WHERE id=?",(timerid,))
+			self._db.execute("UPDATE timers SET position=position-1 WHERE position>?",
+				(record['timer'],))
+		elif record['op'] == 'order':
+			self._timer_ids = [self._timer_ids[i] for i in record['order']]
+			self._db.executemany("UPDATE timers SET position=? WHERE id=?",
+				enumerate(self._timer_ids))
+		elif record['op'] == 'fields':
+			self._update_fields(record['timer'],record['fields'])
+		elif record['op'] == 'splice':
+			self._splice_intervals(record['timer'],record['from'],record['intervals'])
+		else:
+			raise ValueError("Unknown data store op "+str(record['op']))
+
+	def _update_fields (self, index, fields):
+		"""_update_fields internal function
+		Updates the non-interval keys of the timer at the given index.
+		"""
+		timerid = self._timer_ids[index]
+		row = self._db.execute("SELECT fields FROM timers WHERE id=?",(timerid,)).fetchone()
+		otherfields = json.loads(row[0]) if row[0] else {}
+		for key,value in fields.items():
+			for column in self.TIMER_COLUMNS:
+				if column[0] == key:
+					self._db.execute("UPDATE timers SET "+column[1]+"=? WHERE id=?",
+						(value,timerid))
+					break
+			else:
+				otherfields[key] = value
+		self._db.execute("UPDATE timers SET fields=? WHERE id=?",
+			(json.dumps(otherfields),timerid))
+
+	def _splice_intervals (self, index, first, intervals):
+		"""_splice_intervals internal function
+		Replaces all intervals from position first onwards for the timer at the given index.
+		"""
+		timerid = self._timer_ids[index]
+		self._db.execute("DELETE FROM intervals WHERE timer=? AND position>=?",(timerid,first))
+		self._db.executemany("INSERT INTO intervals "+
+			"(timer,position,start,end,exported,description) VALUES (?,?,?,?,?,?)",
+			[(timerid,first+i,interval[0],interval[1],bool(interval[2]),interval[3])
+				for i,interval in enumerate(intervals)])
+
+	def interval_summaries (self, index=None):
+		"""interval_summaries function
+		Returns a dict of timer index -> (unexported seconds, latest end) for every timer, or
+		only for the given timer index. The latest end is None for timers with no intervals.
+		"""
+		condition = ""
+		params = ()
+		if index != None:
+			condition = " AND timer=?"
+			params = (self._timer_ids[index],)
+		totals = dict(self._db.execute("SELECT timer,TOTAL(end-start) FROM intervals "+
+			"WHERE exported=0"+condition+" GROUP BY timer",params))
+		ends = dict(self._db.execute("SELECT timer,MAX(end) FROM intervals "+
+			"WHERE 1"+condition+" GROUP BY timer",params))
+		return {i:(totals.get(timerid,0.0),ends.get(timerid))
+			for i,timerid in enumerate(self._timer_ids) if index == None or i == index}
+
+	def interval_positions (self, index, exported=None):
+		"""interval_positions function
+		Returns the positions of the given timer index's intervals with the given exported flag
+		(or all of them if exported is None), in order.
+		"""
+		if exported == None:
+			rows = self._db.execute("SELECT position FROM intervals WHERE timer=? "+
+				"ORDER BY position",(self._timer_ids[index],))
+		else:
+			rows = self._db.execute("SELECT position FROM intervals WHERE exported=? AND timer=? "+
+				"ORDER BY position",(bool(exported),self._timer_ids[index]))
+		return [row[0] for row in rows]
+
+	def query_intervals (self, exported=None):
+		"""query_intervals generator
+		Yields (timer index, position, [start,end,exported,description]) for every interval with
+		the given exported flag (or every interval if exported is None), ordered by timer index
+		and then start.
+		"""
+		query = "SELECT timers.position,intervals.position,start,end,exported,"+ \
+			"intervals.description FROM intervals JOIN timers ON timers.id=intervals.timer"
+		params = ()
+		if exported != None:
+			query += " WHERE exported=?"
+			params = (bool(exported),)
+		query += " ORDER BY timers.position,start"
+		for index,position,start,end,exported,description in self._db.execute(query,params):
+			yield index,position,[start,end,bool(exported),description]
+
+	def close (self):
+		"""close function
+		Closes the database connection.
+		"""
+		self._db.close()
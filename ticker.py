@@ -0,0 +1,66 @@
+"""ticker module
+Author = Richard D. Fears
+Created = 2026-10-17
+Description = Provides the Ticker class, a single shared after() loop which wakes once per
+	second and updates everything which displays running time.
+"""
+# Standard Python library imports
+import time
+
+class Ticker:
+	"""Ticker class
+	Calls every subscribed function once per second, in subscription order, with the current time.
+	The after() loop only runs while there is at least one subscriber, and each wakeup is
+	scheduled just after the next whole-second boundary, so displayed seconds change together.
+	"""
+
+	# Milliseconds to wait past the second boundary, so rounding never lands just before it
+	BOUNDARY_SLACK = 5
+
+	def __init__ (self, widget):
+		"""Ticker constructor
+		widget is any Tk widget, used for scheduling the after() calls.
+		"""
+		self._widget = widget
+		self._subscribers = []
+		self._updater = None
+
+	def subscribe (self, callback):
+		"""subscribe function
+		Registers a function which accepts one argument: the current time (Unixtime). It will be
+		called on every tick until unsubscribed. Subscribing more than once has no extra effect.
+		"""
+		if callback in self._subscribers:
+			return
+		self._subscribers.append(callback)
+		if self._updater == None:
+			self._schedule()
+
+	def unsubscribe (self, callback):
+		"""unsubscribe function
+		Stops calling the given function. Does nothing if it was not subscribed.
+		"""
+		if callback in self._subscribers:
+			self._subscribers.remove(callback)
+		if len(self._subscribers) == 0 and self._updater != None:
+			self._widget.after_cancel(self._updater)
+			self._updater = None
+
+	def _schedule (self):
+		"""_schedule internal function
+		Schedules the next tick just after the next whole-second boundary.
+		"""
+		delay = 1000-int((time.time()%1)*1000)+self.BOUNDARY_SLACK
+		self._updater = self._widget.after(delay,self._tick)
+
+	def _tick (self):
+		"""_tick internal function
+		Calls every subscriber in a single pass and then schedules the next tick.
+		"""
+		self._updater = None
+		now = time.time()
+		# Copy the list, as subscribers may unsubscribe while being called
+		for callback in self._subscribers[:]:
+			callback(now)
+		if len(self._subscribers) > 0 and self._updater == None:
+			self._schedule()
@@ -17,28 +17,13 @@ class TimerButton (tk.Frame):
 	"""TimerButton class
 	Displays a grid Frame with a description label on the far left, count-up timer in the middle,
 	and a button to start/stop the timer on the far right.
+	The data and running state belong to a TimerModel. A TimerButton can be re-bound to a
+	different TimerModel at any time, so that a handful of buttons can display a long list.
 	"""
 
-	OLDEST_CONVERTIBLE_DATA_VERSION = [1,0,0]
-	DEFAULT_DATA = {
-		'version':[1,0,0],
-		# intervals is a list of lists. Each of the sublists has 4 elements:
-		# start time (Unixtime), end time (Unixtime), exported (Boolean), description (String)
-		'intervals':[],
-		'title':"TIMER",
-		'description':"Default timer",
-		'source system':"YATTi",
-	}
 	OLDEST_CONVERTIBLE_SETTINGS_VERSION = [1,0,0]
 	DEFAULT_SETTINGS = {
 		'version':[1,0,0],
-		'merge qualifications':{
-			'overlapping intervals':True,
-			'adjacent intervals':True,
-			'delete short':True,
-			'max adjacency distance':120.0, # Allow pausing, entering description, then resuming
-			'max short distance':2.0,
-		},
 		'description truncation':{
 			'pad width':10,
 			'suffix char':'\N{HORIZONTAL ELLIPSIS}',
@@ -68,32 +53,10 @@ class TimerButton (tk.Frame):
 			'start':{'size':12,}
 		},
 	}
-
-	def _data_version_update (self, olddata):
-		"""_data_version_update internal function
-		Updates the old data to the new format, based on relative versions.
-		"""
-		# Check for versions which are incompatible with list-of-numbers versions
-		try:
-			olddata['version'] < [0]
-		except:
-			raise VersionException(VersionException.BAD_TYPE,olddata['version'])
-
-		# If the data version is later than the program version, we will not know how to convert
-		if olddata['version'] > TimerButton.DEFAULT_DATA['version']:
-			raise VersionException(VersionException.TOO_NEW,
-				olddata['version'],TimerButton.DEFAULT_DATA['version'])
-
-		# If the old version is too old, we will not know how to convert
-		if olddata['version'] < TimerButton.OLDEST_CONVERTIBLE_DATA_VERSION:
-			raise VersionException(VersionException.TOO_OLD,
-				olddata['version'],TimerButton.DEFAULT_DATA['version'])
-
-		# Finally, convert incrementally through all the versions
-		# Below is some sample code to copy:
-		#if olddata['version'] < [1,1]:
-		#	olddata['somevariable'] = olddata['oldvariable']
-		#	olddata['version'] = [1,1]
+	# Text widths measured in the description font, shared by all TimerButtons.
+	# Keyed by (font configuration, text); cleared whenever it reaches MEASURE_CACHE_SIZE.
+	_measure_cache = {}
+	MEASURE_CACHE_SIZE = 10000
 
 	def _settings_version_update (self, oldsettings):
 		"""_settings_version_update internal function
@@ -147,26 +110,29 @@ class TimerButton (tk.Frame):
 		#	oldtheme['somevariable'] = oldtheme['oldvariable']
 		#	oldtheme['version'] = [1,1]
 
-	def __init__ (self, parent, timerdata=None, timersettings=None, timertheme=None,
-		*args, **options):
+	def __init__ (self, parent, model=None, timersettings=None, timertheme=None,
+		applytheme=True, *args, **options):
 		"""TimerButton constructor
-		timerdata, timersettings, and timertheme are pre-populated versions of each of the defaults
-		defined within this class, for initializing a timer button with non-default
-		data/settings/theme.
-		title is the very-short description of the timer (<15 chars).
-		description is a longer description and will be truncated appropriately.
+		model is the TimerModel to display (see bind_model).
+		timersettings and timertheme are pre-populated versions of each of the defaults defined
+		within this class, for initializing a timer button with non-default settings/theme.
+		If applytheme is False, the caller must call update_theme (or update_themes) later.
+		The model's title is the very-short description of the timer (<15 chars).
+		The model's description is a longer description and will be truncated appropriately.
 		"""
 		super().__init__(parent,*args,**options)
 
 		# Initialize internal variables
-		# The callbacks array for when the toggle function is called
-		self._toggle_callbacks = []
 		# The callbacks array for when any other part of the widget is clicked
 		self._labelclick_callbacks = []
-
-		# Update the timerdata, timersettings, and timertheme parameters (or set to defaults)
-		self._data = helper.dictVersionUpdate(timerdata,self._data_version_update,
-			self.DEFAULT_DATA)
+		# The model currently displayed, and what was last displayed for it
+		self._model = None
+		self._desc_text = ""
+		self._desc_font_key = None
+		self._time_text = None
+		self._shown_running = None
+
+		# Update the timersettings and timertheme parameters (or set to defaults)
 		self._settings = helper.dictVersionUpdate(timersettings,self._settings_version_update,
 			self.DEFAULT_SETTINGS)
 		self._theme = helper.dictVersionUpdate(timertheme,self._theme_version_update,
@@ -180,15 +146,14 @@ class TimerButton (tk.Frame):
 		self._desc_font = tkfont.Font()
 		self._desc_label = tk.Label(self,font=self._desc_font,anchor='w')
 		self._desc_label.grid(column=1,row=2,sticky='ew')
+		# The description can only be truncated once the label's width is known
+		self._desc_label.bind('<Configure>',lambda e,self=self: self._truncate_description())
 
 		# Build the timer label
 		self._running = tk.BooleanVar(False)
-		self._timer_updater = None
-		self._curr_start_time = None
 		self._timer_font = tkfont.Font()
 		self._timer_label = tk.Label(self,text="00:00:00",font=self._timer_font)
 		self._timer_label.grid(column=2,row=1,rowspan=2,padx=10)
-		self._update_timer(restarttimer=False)
 
 		# Build the start/pause button
 		self._start_font = tkfont.Font()
@@ -196,136 +161,112 @@ class TimerButton (tk.Frame):
 			command=self._toggle,font=self._start_font,variable=self._running,indicatoron=False)
 		self._start_button.grid(column=3,row=1,rowspan=2)
 
-		# Update the theme from the dicts
+		# Update the theme from the dicts (unless the caller will theme many buttons at once)
+		self.bind_model(model)
+		if applytheme:
+			self.update_theme()
+
+	def bind_model (self, model):
+		"""bind_model function
+		Displays the given TimerModel (or nothing, if model is None) in this button. The button
+		redraws whenever the model notifies it of an update.
+		"""
+		if model is self._model:
+			return
+		if self._model != None:
+			self._model.unregister_update_callback(self._model_updated)
+		self._model = model
+		if self._model != None:
+			self._model.register_update_callback(self._model_updated)
 		self.update_data()
-		self.update_theme()
 
-	def _toggle (self, fire_callbacks=True):
+	@property
+	def model (self):
+		return self._model
+
+	def _toggle (self):
 		"""_toggle internal function
-		Toggles the timer between running and paused.
+		Called when the start/pause button is clicked. Starts/stops the model.
 		"""
-		# Before any start or stop, sort the intervals
-		self._data['intervals'].sort()
-		if self.running:
-			self._start_button.configure(text=helper.PAUSE_CHAR)
-			self._curr_start_time = time.time()
-			self._timer_updater = self.after(500,self._update_timer)
-		else:
-			self._start_button.configure(text=helper.PLAY_CHAR)
-			self.after_cancel(self._timer_updater)
-			self._update_timer(restarttimer=False)
-			self._curr_start_time = None
-		# Update the font colors
-		self._update_active_theme()
-		# Call the toggle callback functions
-		if fire_callbacks:
-			for f in self._toggle_callbacks:
-				f(self)
-	
-	def _update_timer (self, restarttimer=True):
-		"""_update_timer internal function
-		Updates the label to the new time, as determined by the sum of the intervals in
-		timer_data.intervals and the time between curr_start_time and time.time.
-		If restarttimer is True, it fires an after with a 500ms delay to call this function.
+		if self._model == None:
+			self._running.set(False)
+			return
+		self._model.set_running(self._running.get())
+
+	def _model_updated (self, model):
+		"""_model_updated callback function
+		Called by the model whenever its time, running state, or data changes. Only touches the
+		widgets whose displayed values actually changed.
 		"""
-		# Grab the current time to compare to the start time
-		end_time = time.time()
-		# Store the interval
-		self._store_time(end_time)
-		# We've stored the most recent interval, so check if it should actually exist.
-		# If the timer is now off, and we want to delete short (i.e. mistake) intervals,
-		# and the most recent interval is short enough, then delete it.
-		deleteshort = self._settings['merge qualifications']['delete short']
-		shortdistance = self._settings['merge qualifications']['max short distance']
-		if (not restarttimer) and deleteshort and self._curr_start_time != None \
-			and end_time-self._curr_start_time <= shortdistance:
-			del self._data['intervals'][-1]
-		# Add up all the time from both the stored intervals and the current interval
-		sum_time = self.total_elapsed_time(end_time)
-		# Convert it to a readable time and store it in the label
+		# Convert the elapsed time to a readable time and store it in the label
+		sum_time = model.total_elapsed_time()
 		hours = int(sum_time/3600)
 		minutes = int(sum_time/60)%60
 		seconds = int(sum_time)%60
 		new_text = '{:0>2}:{:0>2}:{:0>2}'.format(hours,minutes,seconds)
-		self._timer_label.configure(text=new_text)
-		# Setup the next timer
-		if restarttimer:
-			self._timer_updater = self.after(500,self._update_timer)
-
-	def total_elapsed_time (self, end_time=0, unexportedonly=True):
-		"""total_elapsed_time function
-		Add up all the time from both the stored intervals and the current interval.
-		"""
-		sum_time = 0
-		for interval in self._data['intervals']:
-			if not interval[2] or not unexportedonly:
-				sum_time += interval[1]-interval[0]
-		return sum_time
-
-	def _store_time (self,end_time):
-		"""_store_time internal function
-		Either updates the current/last interval, or adds a new interval. The exact behavior is
-		dependent on settings. It can be configured to replace overlapping intervals with
-		unioned intervals, replace two nearby intervals with a single joined interval, or always
-		store a new interval unless the previous start time exactly matches the current start time.
-		"""
-		# If the timer is not started right now, there's nothing to store
-		if self._curr_start_time == None:
-			return
-		# If there is no previous interval, skip all the later logic and just add the new interval
-		if len(self._data['intervals']) == 0:
-			self._data['intervals'].append([self._curr_start_time,end_time,False,""])
-			return
-		# Next, check if the start times match exactly; if they do, skip the later logic
-		# and just replace the latest interval
-		if self._data['intervals'][-1][0] == self._curr_start_time:
-			self._data['intervals'][-1][1] = end_time
-			return
-		# Now on to the main meat of this function
-
-		# Some helper variables
-		replace = False
-		replaceOverlapping = self._settings['merge qualifications']['overlapping intervals']
-		replaceAdjacent = self._settings['merge qualifications']['adjacent intervals']
-		maxAdjacent = self._settings['merge qualifications']['max adjacency distance']
-		new_start_time = self._curr_start_time
-		new_end_time = end_time
-		old_start_time = self._data['intervals'][-1][0]
-		old_end_time = self._data['intervals'][-1][1]
-
-		# If the old interval contains the new start time, we should use the old start time,
-		# but the new end time, erasing any future end time
-		if replaceOverlapping and new_start_time > old_start_time and new_start_time < old_end_time:
-			# By definition, the overlapping and adjacent conditions cannot happen at the same
-			# time, so if there is an overlap replacement, do it now and exit
-			self._curr_start_time = old_start_time
-			self._data['intervals'][-1][0] = old_start_time
-			self._data['intervals'][-1][1] = new_end_time
-			return
-
-		# If the intervals are close enough, join them
-		if replaceAdjacent and new_start_time > old_end_time \
-			and new_start_time-old_end_time <= maxAdjacent:
-			self._curr_start_time = old_start_time
-			self._data['intervals'][-1][0] = old_start_time
-			self._data['intervals'][-1][1] = new_end_time
-			return
-
-		# Finally, we've passed all the logic for joining intervals, we should instead create new
-		self._data['intervals'].append([new_start_time,new_end_time,False,""])
+		if new_text != self._time_text:
+			self._time_text = new_text
+			self._timer_label.configure(text=new_text)
+		# Update the button and font colors if the running state changed
+		if model.running != self._shown_running:
+			self._shown_running = model.running
+			self._running.set(model.running)
+			self._start_button.configure(
+				text=helper.PAUSE_CHAR if model.running else helper.PLAY_CHAR)
+			self._update_active_theme()
+		# Update the labels if the title/description changed
+		if self._title_label.cget('text') != model._data['title']:
+			self._title_label.configure(text=model._data['title'])
+		if self._desc_text != model._data['description']:
+			self._desc_text = model._data['description']
+			self._desc_label.configure(text=self._desc_text)
+			self._truncate_description()
 
 	def update_data (self):
 		"""update_data function
-		Updates the labels from the data attribute. Used when the user updates the title/desc.
+		Redraws everything from the model. Used when a different model is bound.
 		"""
-		self._title_label.configure(text=self._data['title'])
-		self._desc_label.configure(text=self._data['description'])
-		self._update_timer(restarttimer=False)
+		self._time_text = None
+		self._shown_running = None
+		if self._model == None:
+			self._desc_text = ""
+			self._title_label.configure(text="")
+			self._desc_label.configure(text="")
+			self._timer_label.configure(text="")
+			self._running.set(False)
+			self._start_button.configure(text=helper.PLAY_CHAR)
+			self._update_active_theme()
+		else:
+			self._model_updated(self._model)
 
 	def update_theme (self):
 		"""update_theme function
 		Updates the fonts/colors/styles from the theme attribute. Used when the user changes
-		the theme.
+		the theme. To theme many buttons at once, use update_themes instead.
+		"""
+		TimerButton.update_themes([self])
+
+	@staticmethod
+	def update_themes (buttons):
+		"""update_themes static function
+		Updates the theme of every given button with only two layout passes in total: one to
+		measure all the buttons' natural heights, and one to resize them all before truncating
+		all of the descriptions together.
+		"""
+		for button in buttons:
+			button._apply_theme()
+		if len(buttons) == 0:
+			return
+		buttons[0].update_idletasks()
+		for button in buttons:
+			button._fix_size()
+		buttons[0].update_idletasks()
+		for button in buttons:
+			button._truncate_description()
+
+	def _apply_theme (self):
+		"""_apply_theme internal function
+		Configures the sub-widgets and fonts from the theme, without any layout pass.
 		"""
 		widgets = (
 			(self,'widget'),
@@ -349,24 +290,24 @@ class TimerButton (tk.Frame):
 			helper.configThemeFromDict(widget,self._theme,'base',name)
 		for widget,name in fontwidgets:
 			helper.configThemeFromDict(widget,self._theme,'fonts',name)
+		# Remember the description font's configuration, for looking up cached widths
+		self._desc_font_key = tuple(sorted(self._desc_font.configure().items()))
 		# Handle any active theme updates
 		self._update_active_theme()
 
-		# Finally, turn off grid-propagation and force the width to be a certain value.
-		# This way, the height will automatically expand appropriately, but the width will
-		# remain a certain size for future parent widgets.
-		# Make sure to grab the desired height first.
-		self.update()
-		targetheight = self.winfo_height()
+	def _fix_size (self):
+		"""_fix_size internal function
+		Turns off grid-propagation and forces the width to be a certain value. This way, the
+		height will automatically expand appropriately, but the width will remain a certain size
+		for future parent widgets.
+		Must be called after a layout pass following _apply_theme, so that the requested height is
+		up to date. The requested height does not depend on the button being mapped, so this also
+		works for the hidden buttons in a TimerList.
+		"""
+		targetheight = self.winfo_reqheight()
 		targetwidth = self._theme['base']['widget']['width']
 		self.grid_propagate(False)
-		if self.winfo_width() == 1:
-			self.after(20,lambda self=self:self.update_theme())
-			self.configure(height=50,width=50)
-		else:
-			self.configure(height=targetheight,width=targetwidth)
-			self.update()
-			self._truncate_description()
+		self.configure(height=targetheight,width=targetwidth)
 
 	def _truncate_description (self):
 		"""_truncate_description internal function
@@ -375,20 +316,40 @@ class TimerButton (tk.Frame):
 		# First check if the text already fits in the label
 		padwidth = self._settings['description truncation']['pad width']
 		labelwidth = self._desc_label.winfo_width()
-		desctext = self._data['description']
-		textwidth = self._desc_font.measure(desctext)
+		# If the label has not been laid out yet, wait for its <Configure> event
+		if labelwidth <= 1:
+			return
+		desctext = self._desc_text
+		textwidth = self._measure_desc(desctext)
 		if textwidth+padwidth <= labelwidth:
 			# If it does, go ahead and set the text, then exit
 			self._desc_label.configure(text=desctext)
 			return
-		# Otherwise, decrementally check substrings of the label text until it fits
+		# Otherwise, bisect for the longest prefix of the label text which fits
 		suffixchar = self._settings['description truncation']['suffix char']
-		suffixcharwidth = self._desc_font.measure(suffixchar)
-		for i in range(len(desctext),0,-1):
-			textwidth = self._desc_font.measure(desctext[:i])
-			if textwidth+padwidth+suffixcharwidth <= labelwidth:
-				self._desc_label.configure(text=desctext[:i]+suffixchar)
-				return
+		maxwidth = labelwidth-padwidth-self._measure_desc(suffixchar)
+		low = 0
+		high = len(desctext)
+		while low < high:
+			mid = (low+high+1)//2
+			if self._measure_desc(desctext[:mid]) <= maxwidth:
+				low = mid
+			else:
+				high = mid-1
+		if low > 0:
+			self._desc_label.configure(text=desctext[:low]+suffixchar)
+
+	def _measure_desc (self, text):
+		"""_measure_desc internal function
+		Returns the width of the text in the description font. Widths are cached per font
+		configuration and shared by all TimerButtons, so re-truncating is mostly free.
+		"""
+		key = (self._desc_font_key,text)
+		if key not in TimerButton._measure_cache:
+			if len(TimerButton._measure_cache) >= TimerButton.MEASURE_CACHE_SIZE:
+				TimerButton._measure_cache.clear()
+			TimerButton._measure_cache[key] = self._desc_font.measure(text)
+		return TimerButton._measure_cache[key]
 
 	def _update_active_theme (self):
 		"""_update_active_theme internal function
@@ -401,47 +362,39 @@ class TimerButton (tk.Frame):
 			(self._timer_label,'time'),
 			(self._start_button,'start'),
 		)
-		if self.running:
+		if self._model != None and self._model.running:
 			for widget,name in widgets:
 				helper.configThemeFromDict(widget,self._theme,'active',name)
 		else:
 			for widget,name in widgets:
 				helper.configThemeFromDict(widget,self._theme,'base',name)
 
-	def register_toggle_callback (self, callback):
-		"""register_toggle_callback function
-		Registers a callback function which accepts one argument: this timer button widget.
-		The callback function is called when the timer button toggles between active and inactive.
-		This allows the main program to detect when the timer button is clicked, which in turn
-		allows the main program to disable all other timers.
-		"""
-		self._toggle_callbacks.append(callback)
-
 	def register_labelclick_callback (self, callback):
 		"""register_labelclick_callback function
-		Registers a callback function which accepts one argument: this timer button widget.
+		Registers a callback function which accepts one argument: the TimerModel currently
+		displayed by this button.
 		The callback function is called when any part of the TimerButton is clicked other than
 		the start/pause button itself. This allows the main program to "select" the timer,
 		which means it knows when to display the full data.
 		"""
 		self._labelclick_callbacks.append(callback)
-		self._title_label.bind('<Button-1>', lambda e,self=self: callback(self))
-		self._desc_label.bind('<Button-1>', lambda e,self=self: callback(self))
-		self._timer_label.bind('<Button-1>', lambda e,self=self: callback(self))
-		self.bind('<Button-1>', lambda e,self=self: callback(self))
+		for widget in (self,self._title_label,self._desc_label,self._timer_label):
+			widget.bind('<Button-1>',lambda e,self=self: self._label_clicked())
 
-	@property
-	def running (self):
-		return bool(self._running.get())
-	@running.setter
-	def running (self, value):
-		if bool(self._running.get()) != value:
-			self._running.set(value)
-			self._toggle(fire_callbacks=False)
+	def _label_clicked (self):
+		"""_label_clicked internal function
+		Calls each labelclick callback with the displayed model (if there is one).
+		"""
+		if self._model == None:
+			return
+		for f in self._labelclick_callbacks:
+			f(self._model)
 
 
 if __name__ == "__main__":
 	import traceback
+	from timermodel import TimerModel
+	from ticker import Ticker
 	try:
 		def on_close ():
 			for timer in timers:
@@ -458,6 +411,7 @@ if __name__ == "__main__":
 					time.strftime('%Y/%m/%d %H:%M:%S',time.localtime(interval[1])))
 			print()
 		root = tk.Tk()
+		ticker = Ticker(root)
 		timers = []
 		timer_datas = [
 			{'intervals':[[0,3500,False,"Blah"]],'title':"COE-4840",
@@ -468,11 +422,12 @@ if __name__ == "__main__":
 		frame = tk.Frame(root,width=400,height=200)
 		frame.pack(fill='both',expand=True)
 		for data in timer_datas:
-			timer = TimerButton(frame, timerdata=data)
-			timer.pack()
+			timer = TimerModel(data,None,ticker)
 			timer.register_toggle_callback(togglecallback)
-			timer.register_labelclick_callback(labelcallback)
 			timers.append(timer)
+			button = TimerButton(frame,timer)
+			button.pack()
+			button.register_labelclick_callback(labelcallback)
 		root.protocol('WM_DELETE_WINDOW',on_close)
 		root.mainloop()
 	except Exception as e:
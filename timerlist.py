@@ -0,0 +1,206 @@
+"""timerlist module
+Author = Richard D. Fears
+Created = 2026-10-17
+Description = Provides the TimerList Tk widget, a scrollable list of timers which only builds
+	TimerButtons for the rows currently visible, so it stays fast with thousands of timers.
+"""
+# Tk imports
+import tkinter as tk
+# Standard Python library imports
+import math
+# My code imports
+from timerbutton import TimerButton
+
+class TimerList (tk.Frame):
+	"""TimerList class
+	Displays a canvas with a vertical scrollbar for a list of TimerModels. The canvas scrollregion
+	covers every row, but only the rows in the viewport have a TimerButton; the pool of buttons is
+	recycled (re-bound to different models) as the list scrolls. Rows are assigned to buttons by
+	index modulo the pool size, so scrolling by one row only re-binds one button.
+	Offscreen timers keep running in their models; they simply have no button to redraw.
+	"""
+
+	def __init__ (self, parent, timersettings=None, timertheme=None, *args, **options):
+		"""TimerList constructor
+		timersettings and timertheme are passed on to each TimerButton (see TimerButton).
+		"""
+		super().__init__(parent,*args,**options)
+
+		# Initialize internal variables
+		self._settings = timersettings
+		self._theme = timertheme
+		# The models in display order
+		self._models = []
+		# The pool of buttons, and the canvas window item for each
+		self._buttons = []
+		self._windows = []
+		# The callbacks array for when a button's labels are clicked
+		self._labelclick_callbacks = []
+		# Avoid laying out the rows from within a layout
+		self._in_layout = False
+		self._relayout = False
+		self._layout_pending = None
+		self._scrollregion = None
+
+		# Build the canvas and scrollbar
+		self._canvas = tk.Canvas(self)
+		self._scrollbar = tk.Scrollbar(self,orient='vertical',command=self._canvas.yview)
+		self._canvas.config(yscrollcommand=self._scrolled)
+		self._scrollbar.pack(side='right',fill='y',expand=True)
+		self._canvas.pack(side='left',fill='y',expand=True)
+		self._canvas.bind('<Configure>',lambda e,self=self: self._schedule_layout())
+
+		# Always keep one button around, so that the row height can be measured
+		self._grow_pool(1)
+
+	def _grow_pool (self, count):
+		"""_grow_pool internal function
+		Adds (hidden) buttons to the pool until it has at least count buttons. All of the new
+		buttons are themed together, with a single layout pass.
+		"""
+		newbuttons = []
+		while len(self._buttons) < count:
+			button = TimerButton(self._canvas,None,self._settings,self._theme,applytheme=False)
+			for callback in self._labelclick_callbacks:
+				button.register_labelclick_callback(callback)
+			# Re-layout if the button's size changes (e.g. after a theme update)
+			button.bind('<Configure>',lambda e,self=self: self._schedule_layout(),add='+')
+			self._buttons.append(button)
+			self._windows.append(self._canvas.create_window((0,0),window=button,anchor='nw',
+				state='hidden'))
+			newbuttons.append(button)
+		TimerButton.update_themes(newbuttons)
+
+	def _row_height (self):
+		"""_row_height internal function
+		Returns the height of a single row. All TimerButtons share a theme, so they are all the
+		same height.
+		"""
+		return max(self._buttons[0].winfo_reqheight(),1)
+
+	def _scrolled (self, first, last):
+		"""_scrolled callback function
+		Called by the canvas whenever its view changes. Updates the scrollbar and the rows.
+		"""
+		self._scrollbar.set(first,last)
+		self._layout_rows()
+
+	def _schedule_layout (self):
+		"""_schedule_layout internal function
+		Lays out the rows once Tk is idle, coalescing multiple requests.
+		"""
+		if self._layout_pending == None:
+			self._layout_pending = self.after_idle(self._layout_rows)
+
+	def _layout_rows (self):
+		"""_layout_rows internal function
+		Updates the scrollregion, then binds and places a button for each visible row and hides
+		the rest of the pool. If called again while laying out (e.g. from the layout pass when
+		growing the pool), the rows are laid out once more at the end instead.
+		"""
+		if self._layout_pending != None:
+			self.after_cancel(self._layout_pending)
+			self._layout_pending = None
+		if self._in_layout:
+			self._relayout = True
+			return
+		self._in_layout = True
+		try:
+			self._relayout = True
+			while self._relayout:
+				self._relayout = False
+				self._place_rows()
+		finally:
+			self._in_layout = False
+
+	def _place_rows (self):
+		"""_place_rows internal function
+		Does the actual work for _layout_rows.
+		"""
+		rowheight = self._row_height()
+		rowwidth = self._buttons[0].winfo_reqwidth()
+		# Only reconfigure the scrollregion if it changed, as it triggers _scrolled
+		scrollregion = (0,0,rowwidth,rowheight*len(self._models))
+		if scrollregion != self._scrollregion:
+			self._scrollregion = scrollregion
+			self._canvas.config(scrollregion=scrollregion,width=rowwidth,
+				yscrollincrement=rowheight)
+		# Figure out which rows are visible
+		top = max(self._canvas.canvasy(0),0)
+		viewheight = self._canvas.winfo_height()
+		first = int(top//rowheight)
+		last = min(len(self._models),int(math.ceil((top+viewheight)/rowheight)))
+		self._grow_pool(last-first)
+		# Place the visible rows, recycling buttons by index modulo the pool size
+		used = set()
+		for index in range(first,last):
+			slot = index%len(self._buttons)
+			used.add(slot)
+			self._buttons[slot].bind_model(self._models[index])
+			self._canvas.coords(self._windows[slot],0,index*rowheight)
+			self._canvas.itemconfigure(self._windows[slot],state='normal')
+		# Hide the rest
+		for slot in range(len(self._buttons)):
+			if slot not in used:
+				self._buttons[slot].bind_model(None)
+				self._canvas.itemconfigure(self._windows[slot],state='hidden')
+
+	def set_models (self, models):
+		"""set_models function
+		Replaces the list of displayed models (e.g. after sorting). The buttons are re-bound
+		rather than rebuilt.
+		"""
+		self._models = list(models)
+		self._layout_rows()
+
+	def append (self, model):
+		"""append function
+		Adds a model to the end of the list.
+		"""
+		self._models.append(model)
+		self._layout_rows()
+
+	def remove (self, model):
+		"""remove function
+		Removes a model from the list.
+		"""
+		self._models.remove(model)
+		self._layout_rows()
+
+	def see (self, index):
+		"""see function
+		Scrolls the list so that the row at the given index is visible.
+		"""
+		self._layout_rows()
+		if len(self._models) == 0:
+			return
+		if index < 0:
+			index += len(self._models)
+		rowheight = self._row_height()
+		top = self._canvas.canvasy(0)
+		viewheight = self._canvas.winfo_height()
+		if index*rowheight < top or (index+1)*rowheight > top+viewheight:
+			self._canvas.yview_moveto(index/len(self._models))
+
+	def yview_scroll (self, number, what):
+		"""yview_scroll function
+		Scrolls the list; see the Tk canvas's yview_scroll.
+		"""
+		self._canvas.yview_scroll(number,what)
+
+	def register_labelclick_callback (self, callback):
+		"""register_labelclick_callback function
+		Registers a callback function which accepts one argument: the TimerModel whose row was
+		clicked. See TimerButton.register_labelclick_callback.
+		"""
+		self._labelclick_callbacks.append(callback)
+		for button in self._buttons:
+			button.register_labelclick_callback(callback)
+
+	def update_theme (self):
+		"""update_theme function
+		Updates the fonts/colors/styles of every button in the pool, then re-lays out the rows.
+		"""
+		TimerButton.update_themes(self._buttons)
+		self._scrollregion = None
+		self._layout_rows()
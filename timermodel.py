@@ -0,0 +1,404 @@
+"""timermodel module
+Author = Richard D. Fears
+Created = 2026-10-17
+Description = Provides the TimerModel class, which holds a single timer's data and running state
+	separately from any TimerButton widget, so that timers keep running while scrolled offscreen.
+"""
+# Standard Python library imports
+import time
+# My code imports
+import helper
+from intervalstore import IntervalStore
+from versionexception import VersionException
+
+class TimerModel:
+	"""TimerModel class
+	Holds the data dict for a single timer, tracks whether it is running, and stores the running
+	time as intervals. Views (TimerButtons) register update callbacks to be told when to redraw.
+	"""
+
+	OLDEST_CONVERTIBLE_DATA_VERSION = [1,0,0]
+	DEFAULT_DATA = {
+		'version':[1,0,0],
+		# intervals is a list of lists. Each of the sublists has 4 elements:
+		# start time (Unixtime), end time (Unixtime), exported (Boolean), description (String)
+		# Once loaded, it is replaced by an IntervalStore, which is used in the same way.
+		'intervals':[],
+		'title':"TIMER",
+		'description':"Default timer",
+		'source system':"YATTi",
+		# id is a unique integer, assigned by YattiMain when the timer is added
+	}
+	OLDEST_CONVERTIBLE_SETTINGS_VERSION = [1,0,0]
+	DEFAULT_SETTINGS = {
+		'version':[1,0,0],
+		'merge qualifications':{
+			'overlapping intervals':True,
+			'adjacent intervals':True,
+			'delete short':True,
+			'max adjacency distance':120.0, # Allow pausing, entering description, then resuming
+			'max short distance':2.0,
+		},
+	}
+
+	def _data_version_update (self, olddata):
+		"""_data_version_update internal function
+		Updates the old data to the new format, based on relative versions.
+		"""
+		# Check for versions which are incompatible with list-of-numbers versions
+		try:
+			olddata['version'] < [0]
+		except:
+			raise VersionException(VersionException.BAD_TYPE,olddata['version'])
+
+		# If the data version is later than the program version, we will not know how to convert
+		if olddata['version'] > TimerModel.DEFAULT_DATA['version']:
+			raise VersionException(VersionException.TOO_NEW,
+				olddata['version'],TimerModel.DEFAULT_DATA['version'])
+
+		# If the old version is too old, we will not know how to convert
+		if olddata['version'] < TimerModel.OLDEST_CONVERTIBLE_DATA_VERSION:
+			raise VersionException(VersionException.TOO_OLD,
+				olddata['version'],TimerModel.DEFAULT_DATA['version'])
+
+		# Finally, convert incrementally through all the versions
+		# Below is some sample code to copy:
+		#if olddata['version'] < [1,1]:
+		#	olddata['somevariable'] = olddata['oldvariable']
+		#	olddata['version'] = [1,1]
+
+	def _settings_version_update (self, oldsettings):
+		"""_settings_version_update internal function
+		Updates the old settings to the new format, based on relative versions.
+		"""
+		# Check for versions which are incompatible with list-of-numbers versions
+		try:
+			oldsettings['version'] < [0]
+		except:
+			raise VersionException(VersionException.BAD_TYPE,oldsettings['version'])
+
+		# If the settings version is later than the program version, we will not know how to convert
+		if oldsettings['version'] > TimerModel.DEFAULT_SETTINGS['version']:
+			raise VersionException(VersionException.TOO_NEW,
+				oldsettings['version'],TimerModel.DEFAULT_SETTINGS['version'])
+
+		# If the old version is too old, we will not know how to convert
+		if oldsettings['version'] < TimerModel.OLDEST_CONVERTIBLE_SETTINGS_VERSION:
+			raise VersionException(VersionException.TOO_OLD,
+				oldsettings['version'],TimerModel.DEFAULT_SETTINGS['version'])
+
+		# Finally, convert incrementally through all the versions
+		# Below is some sample code to copy:
+		#if oldsettings['version'] < [1,1]:
+		#	oldsettings['somevariable'] = oldsettings['oldvariable']
+		#	oldsettings['version'] = [1,1]
+
+	def __init__ (self, timerdata, timersettings, ticker, summary=None):
+		"""TimerModel constructor
+		timerdata and timersettings are pre-populated versions of each of the defaults defined
+		within this class, for initializing a timer with non-default data/settings.
+		ticker is the (shared) Ticker which updates the timer while it is running.
+		summary is optional; see _recalculate_closed_time.
+		"""
+		# The callbacks array for when the timer is toggled
+		self._toggle_callbacks = []
+		# The callbacks array for when anything displayable changes (time, running, data)
+		self._update_callbacks = []
+
+		# Update the timerdata and timersettings parameters (or set to defaults)
+		self._data = helper.dictVersionUpdate(timerdata,self._data_version_update,
+			self.DEFAULT_DATA)
+		self._settings = helper.dictVersionUpdate(timersettings,self._settings_version_update,
+			self.DEFAULT_SETTINGS)
+		if not isinstance(self._data['intervals'],IntervalStore):
+			self._data['intervals'] = IntervalStore(self._data['intervals'])
+		# Intervals are kept sorted from here on, as they are added (see _store_time)
+		self._data['intervals'].sort()
+
+		self._running = False
+		self._ticker = ticker
+		self._curr_start_time = None
+		# The interval currently being timed (an IntervalRow), and the cached sum of all other
+		# unexported intervals and latest end time of all other intervals
+		self._open_interval = None
+		self._closed_time = 0
+		self._closed_last_end = None
+		# The interval most recently stopped, which the next interval is normally merged with
+		self._last_closed = None
+		self._recalculate_closed_time(summary)
+
+	def set_running (self, value, fire_callbacks=True):
+		"""set_running function
+		Starts or stops the timer. Toggle callbacks are only fired if fire_callbacks is True
+		(i.e. when the user clicked the start/pause button).
+		"""
+		if self._running == bool(value):
+			return
+		self._running = bool(value)
+		if self._running:
+			self._curr_start_time = time.time()
+			# Store the new interval straight away, so that each tick only needs to extend it
+			self._store_time(self._curr_start_time)
+			self._recalculate_closed_time()
+			self._ticker.subscribe(self._update_timer)
+		else:
+			self._ticker.unsubscribe(self._update_timer)
+			self._update_timer(stopping=True)
+			self._curr_start_time = None
+			if self._open_interval != None:
+				self._last_closed = self._open_interval
+			self._open_interval = None
+			self._recalculate_closed_time()
+		self._fire_update_callbacks()
+		# Call the toggle callback functions
+		if fire_callbacks:
+			for f in self._toggle_callbacks:
+				f(self)
+
+	def _update_timer (self, end_time=None, stopping=False):
+		"""_update_timer internal function
+		Extends the open interval (if running) to end_time (defaulting to time.time) and notifies
+		any views. This is subscribed to the ticker while the timer is running, whether or not
+		the timer currently has a view.
+		stopping should be True only when the timer is being stopped.
+		"""
+		# Grab the current time to compare to the start time
+		if end_time == None:
+			end_time = time.time()
+		if self._open_interval != None:
+			# Extend the open interval
+			self._open_interval[1] = end_time
+			# If the timer is now off, and we want to delete short (i.e. mistake) intervals,
+			# and the open interval is short enough, then delete it.
+			deleteshort = self._settings['merge qualifications']['delete short']
+			shortdistance = self._settings['merge qualifications']['max short distance']
+			if stopping and deleteshort and end_time-self._curr_start_time <= shortdistance:
+				self._remove_open_interval()
+		# Let any views know that the elapsed time changed
+		self._fire_update_callbacks()
+
+	def total_elapsed_time (self, end_time=None, unexportedonly=True):
+		"""total_elapsed_time function
+		Add up all the time from both the stored intervals and the current interval.
+		If unexportedonly, this uses the cached sum of the closed intervals, so it is O(1).
+		"""
+		if not unexportedonly:
+			return self._data['intervals'].total()
+		sum_time = self._closed_time
+		if self._open_interval != None and not self._open_interval[2]:
+			if end_time == None:
+				end_time = self._open_interval[1]
+			sum_time += end_time-self._open_interval[0]
+		return sum_time
+
+	def last_activity (self):
+		"""last_activity function
+		Returns the latest end time of any interval (Unixtime), or None if there are none.
+		Like total_elapsed_time, this uses the cached closed intervals, so it is O(1).
+		"""
+		if self._open_interval != None and (self._closed_last_end == None or
+			self._open_interval[1] > self._closed_last_end):
+			return self._open_interval[1]
+		return self._closed_last_end
+
+	def _recalculate_closed_time (self, summary=None):
+		"""_recalculate_closed_time internal function
+		Re-sums the unexported intervals, and finds the latest end, other than the open one. Only
+		needs to be called when intervals are added, edited, exported, or archived, or the timer
+		is started or stopped; ticks only extend the open interval.
+		summary, if given, is the (unexported seconds, latest end) of all the intervals, as
+		already worked out by the data store (see SQLiteDataStore.interval_summaries), which is
+		used instead while there is no open interval.
+		"""
+		intervals = self._data['intervals']
+		# If the open interval was removed from the data (e.g. archived), store a new one
+		if self._open_interval != None and self._open_interval.deleted:
+			self._open_interval = None
+			self._store_time(time.time())
+		# Ticks are not reported to the intervals' listener (the daily totals) until the open
+		# interval is closed or the totals are read
+		intervals.set_quiet_row(self._open_interval)
+		if summary != None and self._open_interval == None:
+			self._closed_time,self._closed_last_end = summary
+			return
+		openindex = self._open_interval.index if self._open_interval != None else None
+		self._closed_time = intervals.total(unexportedonly=True,skip=openindex)
+		self._closed_last_end = intervals.last_end(skip=openindex)
+
+	def _remove_open_interval (self):
+		"""_remove_open_interval internal function
+		Removes the open interval from the intervals (by identity, not equality).
+		"""
+		if not self._open_interval.deleted:
+			del self._data['intervals'][self._open_interval.index]
+		self._open_interval = None
+
+	def _previous_interval (self, start_time):
+		"""_previous_interval internal function
+		Returns the last interval (IntervalRow) starting at or before start_time, or None. This is
+		normally the last closed interval; otherwise it is found with a binary search.
+		"""
+		intervals = self._data['intervals']
+		last = self._last_closed
+		if last != None and not last.deleted and last[0] <= start_time and \
+			(last.index == len(intervals)-1 or intervals[last.index+1][0] > start_time):
+			return last
+		index = intervals.find_start(start_time)
+		return intervals[index] if index >= 0 else None
+
+	def _store_time (self,end_time):
+		"""_store_time internal function
+		Either updates the current/last interval, or adds a new interval. The exact behavior is
+		dependent on settings. It can be configured to replace overlapping intervals with
+		unioned intervals, replace two nearby intervals with a single joined interval, or always
+		store a new interval unless the previous start time exactly matches the current start time.
+		Whichever interval was updated/added becomes the open interval. The intervals are sorted,
+		so the new interval is compared with (and inserted after) the one starting before it.
+		"""
+		# If the timer is not started right now, there's nothing to store
+		if self._curr_start_time == None:
+			return
+		intervals = self._data['intervals']
+		previous = self._previous_interval(self._curr_start_time)
+		# If there is no previous interval, skip all the later logic and just add the new interval
+		if previous == None:
+			self._open_interval = intervals.insert_sorted([self._curr_start_time,end_time,False,""])
+			return
+		# Next, check if the start times match exactly; if they do, skip the later logic
+		# and just replace the latest interval
+		if previous[0] == self._curr_start_time:
+			previous[1] = end_time
+			self._open_interval = previous
+			return
+		# Now on to the main meat of this function
+
+		# Some helper variables
+		replace = False
+		replaceOverlapping = self._settings['merge qualifications']['overlapping intervals']
+		replaceAdjacent = self._settings['merge qualifications']['adjacent intervals']
+		maxAdjacent = self._settings['merge qualifications']['max adjacency distance']
+		new_start_time = self._curr_start_time
+		new_end_time = end_time
+		old_start_time = previous[0]
+		old_end_time = previous[1]
+
+		# If the old interval contains the new start time, we should use the old start time,
+		# but the new end time, erasing any future end time
+		if replaceOverlapping and new_start_time > old_start_time and new_start_time < old_end_time:
+			# By definition, the overlapping and adjacent conditions cannot happen at the same
+			# time, so if there is an overlap replacement, do it now and exit
+			self._curr_start_time = old_start_time
+			previous[0] = old_start_time
+			previous[1] = new_end_time
+			self._open_interval = previous
+			return
+
+		# If the intervals are close enough, join them
+		if replaceAdjacent and new_start_time > old_end_time \
+			and new_start_time-old_end_time <= maxAdjacent:
+			self._curr_start_time = old_start_time
+			previous[0] = old_start_time
+			previous[1] = new_end_time
+			self._open_interval = previous
+			return
+
+		# Finally, we've passed all the logic for joining intervals, we should instead create new
+		self._open_interval = intervals.insert_sorted([new_start_time,new_end_time,False,""])
+
+	def normalize_intervals (self):
+		"""normalize_intervals function
+		Applies the merge qualifications to the whole history at once, in a single sweep through
+		the sorted intervals: overlapping and nearby intervals are joined, and then any short
+		intervals are deleted. Exported intervals are never joined (to anything) or deleted, so
+		nothing already billed changes, and intervals are only joined if they have the same
+		description (or one has none).
+		Running timers are left alone. Returns a tuple of (intervals joined, intervals deleted).
+		"""
+		if self._running:
+			return (0,0)
+		qualifications = self._settings['merge qualifications']
+		intervals = self._data['intervals']
+		intervals.sort()
+		rows = intervals.to_json()
+		merged = []
+		for row in rows:
+			if len(merged) > 0:
+				last = merged[-1]
+				compatible = not last[2] and not row[2] and \
+					(last[3] == row[3] or last[3] == "" or row[3] == "")
+				overlapping = qualifications['overlapping intervals'] and row[0] < last[1]
+				adjacent = qualifications['adjacent intervals'] and row[0] >= last[1] and \
+					row[0]-last[1] <= qualifications['max adjacency distance']
+				if compatible and (overlapping or adjacent):
+					last[1] = max(last[1],row[1])
+					last[3] = last[3] or row[3]
+					continue
+			merged.append(row)
+		joined = len(rows)-len(merged)
+		if qualifications['delete short']:
+			kept = [row for row in merged
+				if row[2] or row[1]-row[0] > qualifications['max short distance']]
+		else:
+			kept = merged
+		deleted = len(merged)-len(kept)
+		if joined+deleted > 0:
+			intervals[:] = kept
+			self.update_data()
+		return (joined,deleted)
+
+	def update_data (self, summary=None):
+		"""update_data function
+		Notifies any views that the data changed. Used when the user updates the title/desc,
+		or whenever the intervals are edited, exported, or archived. Edited intervals are put back
+		in order. summary is optional; see _recalculate_closed_time.
+		"""
+		self._data['intervals'].sort()
+		self._recalculate_closed_time(summary)
+		self._fire_update_callbacks()
+
+	def _fire_update_callbacks (self):
+		"""_fire_update_callbacks internal function
+		Calls each of the registered update callbacks.
+		"""
+		for f in self._update_callbacks[:]:
+			f(self)
+
+	def register_toggle_callback (self, callback):
+		"""register_toggle_callback function
+		Registers a callback function which accepts one argument: this timer.
+		The callback function is called when the user toggles the timer between active and
+		inactive. This allows the main program to disable all other timers.
+		"""
+		self._toggle_callbacks.append(callback)
+
+	def register_update_callback (self, callback):
+		"""register_update_callback function
+		Registers a callback function which accepts one argument: this timer.
+		The callback function is called whenever the elapsed time, running state, or data changes,
+		so that the view currently displaying this timer can redraw.
+		"""
+		self._update_callbacks.append(callback)
+
+	def unregister_update_callback (self, callback):
+		"""unregister_update_callback function
+		Removes a callback function registered with register_update_callback.
+		"""
+		if callback in self._update_callbacks:
+			self._update_callbacks.remove(callback)
+
+	@property
+	def timer_id (self):
+		"""The timer's persistent id (see YattiMain._assign_timer_id)."""
+		return self._data.get('id')
+
+	@property
+	def open_interval (self):
+		"""The interval currently being timed (an IntervalRow of the timer data), or None."""
+		return self._open_interval
+
+	@property
+	def running (self):
+		return self._running
+	@running.setter
+	def running (self, value):
+		self.set_running(value,fire_callbacks=False)
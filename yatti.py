@@ -10,13 +10,22 @@ import tkinter as tk
 import tkinter.font as tkfont
 import tkinter.messagebox as tkmessagebox
 # Standard Python library imports
-import os, sys, json, base64, time, platform, math
+import os, sys, json, base64, time, platform, math, traceback
 from appdirs import AppDirs
 # My code imports
 import helper
-from timerbutton import TimerButton
+from timermodel import TimerModel
+from timerlist import TimerList
 from dataeditor import DataEditor
 from csvexport import CSVExport
+from ticker import Ticker
+from datajournal import DataJournal
+from sqlitedatastore import SQLiteDataStore
+from filewriter import FileWriter
+from heartbeat import Heartbeat
+from archivestore import ArchiveStore
+from archiveviewer import ArchiveViewer
+from rollupcache import RollupCache
 
 class YattiMain:
 	"""YattiMain class
@@ -33,6 +42,7 @@ class YattiMain:
 		'timerbuttons':{},
 		'dataeditor':{},
 		'csvexport':{},
+		'archiveviewer':{},
 		'base':{
 			'buttons':{},
 		},
@@ -50,6 +60,16 @@ class YattiMain:
 		'pause other timers':True,
 		'theme file':'default-theme.json',
 		'data file':'timerdata.json',
+		'data journal':True,
+		'journal compaction records':500,
+		# Seconds to wait after the last change before autosaving
+		'autosave delay':2,
+		# Maximum seconds of changes/running time which may be lost in a crash
+		'max loss seconds':10,
+		# Compression for newly-archived intervals: '', 'gzip' or 'lzma'
+		'archive compression':'gzip',
+		# Whether to normalize every timer's intervals at startup (see _normalize_timers)
+		'normalize on load':False,
 		'passwords file':'passwords.bin',
 		'connection info':{
 			'jira':{
@@ -73,6 +93,10 @@ class YattiMain:
 	DEFAULT_DATA = {
 		'version':[1,0,0],
 		'timerdata':[],
+		# Sequence number of the last journal record included in this snapshot
+		'journal sequence':0,
+		# Id to give the next new timer (see _assign_timer_id)
+		'next timer id':1,
 	}
 	DATA_CONFIG = [
 		{'type':'string','text':"Title/Ticket",'key':'title'},
@@ -203,6 +227,12 @@ class YattiMain:
 		Reads in the default theme, data, settings, and password files. If any of them do not exist
 		yet, it creates base versions.
 		"""
+		# Names of the files (settings/theme/data/passwords) changed since they were last written
+		self._dirty = set()
+		# Pending autosave, and when the oldest unsaved change was made
+		self._root = None
+		self._autosave_pending = None
+		self._autosave_first = None
 		# Get the preferred settings location
 		global DEBUG
 		try:
@@ -226,13 +256,62 @@ class YattiMain:
 		self._theme = self._load_file_or_defaults("theme",
 			configprefix+os.sep+self._settings['theme file'],
 			self._theme_version_update,self.DEFAULT_THEME)
-		self._data = self._load_file_or_defaults("data",
-			dataprefix+os.sep+self._settings['data file'],
-			self._data_version_update,self.DEFAULT_DATA)
+		# The data file is either a JSON snapshot plus journal, or an SQLite database
+		datafilename = dataprefix+os.sep+self._settings['data file']
+		if SQLiteDataStore.handles(datafilename):
+			self._datastore = SQLiteDataStore(datafilename)
+			data = self._datastore.load()
+			# A new database starts off with the JSON data it replaces, so no history is lost
+			if len(data['timerdata']) == 0 and 'version' not in data:
+				data = self._import_json_data(datafilename)
+			self._data = helper.dictVersionUpdate(data,self._data_version_update,self.DEFAULT_DATA)
+			# Store the (possibly converted) version, counter, etc., as only changes are saved
+			for key,value in self._data.items():
+				if key != 'timerdata':
+					self._datastore.record_meta(key,value)
+			self._incremental_saves = True
+			# Export, archiving and timer totals query the database's indexes
+			self._indexed_queries = True
+		else:
+			self._data = self._load_file_or_defaults("data",datafilename,
+				self._data_version_update,self.DEFAULT_DATA)
+			# Replay any changes which were journaled since the last snapshot. This is done even
+			# if journaling has since been turned off, so that no journaled changes are lost.
+			self._datastore = DataJournal(datafilename+".journal",
+				self._settings['journal compaction records'])
+			self._datastore.replay(self._data)
+			self._incremental_saves = self._settings['data journal']
+			self._indexed_queries = False
+		# The running timers are recorded every few seconds in the heartbeat file
+		self._heartbeatfilename = datafilename+".heartbeat"
+		self._last_beat = 0
+		# Each timer's daily totals are cached next to the data file
+		self._rollupsfilename = datafilename+".rollups"
 		self._passwords = self._load_file_or_defaults("passwords",
 			configprefix+os.sep+self._settings['passwords file'],
 			self._passwords_version_update,self.DEFAULT_PASSWORDS,self._decrypt_password_file)
 
+	def _import_json_data (self, datafilename):
+		"""_import_json_data internal function
+		Finds the JSON data file (and journal) which the new, empty SQLite database at datafilename
+		is replacing, and adds its timers to the database. That is the database's filename with a
+		.json extension if it exists, or otherwise the default data file. Returns the data dict.
+		"""
+		for jsonfilename in (os.path.splitext(datafilename)[0]+".json",
+			os.path.join(os.path.dirname(datafilename),self.DEFAULT_SETTINGS['data file'])):
+			if os.path.exists(jsonfilename):
+				break
+		else:
+			return {'timerdata':[]}
+		data = self._load_file_or_defaults("data",jsonfilename,self._data_version_update,
+			self.DEFAULT_DATA)
+		DataJournal(jsonfilename+".journal").replay(data)
+		self._datastore.import_timers(data['timerdata'])
+		# TODO: Switch to debug log
+		print("Imported {} timers from {}.".format(len(data['timerdata']),jsonfilename),
+			file=sys.stderr)
+		return data
+
 	def _decrypt_password_file (self, filetext):
 		"""_decrypt_password_file internal function
 		Takes raw text from an encrypted file and converts it to decrypted JSON text string.
@@ -266,22 +345,13 @@ class YattiMain:
 			thedict = {}
 		# We've either read in and interpreted a JSON dict, or created a base one.
 		# Now make sure to update it/fill it with defaults.
+		original = json.dumps(thedict)
 		thedict = helper.dictVersionUpdate(thedict,updatefunc,defaults)
+		# If that changed anything, the file needs to be (re)written
+		if json.dumps(thedict) != original:
+			self._mark_dirty(dictname)
 		return thedict
 
-	def _canvas_reconfigure (self):
-		"""_canvas_reconfigure callback function
-		Reconfigures the canvas's scrollregion and width when its view is reconfigured.
-		"""
-		# Only reconfigure the canvas if it's already been rendered
-		if not self._canvas.winfo_viewable():
-			self._canvas.after(20,self._canvas_reconfigure)
-			return
-		self._canvas.config(
-			scrollregion=self._canvas.bbox('all'),
-			width=self._timerframe.winfo_width()
-		)
-
 	def run (self):
 		"""run function
 		Main driver function for YATTi program. Builds all the widgets and runs the main loop.
@@ -302,6 +372,17 @@ class YattiMain:
 		self._root.grid_columnconfigure(2,weight=1)
 		self._root.grid_rowconfigure(1,weight=1)
 		self._timers = []
+		# Registry of the timers by their (persistent) id, and each id's position in self._timers
+		self._timers_by_id = {}
+		self._timer_positions = {}
+		# Shared once-per-second updater for running timers and the data editor
+		self._ticker = Ticker(self._root)
+		# All files are written from a background thread
+		self._filewriter = FileWriter(self._root)
+		# Archived intervals, including any old per-title archive files
+		self._archive = ArchiveStore(self._dirs.user_data_dir+os.sep+"archive",
+			self._dirs.user_data_dir,self._settings['archive compression'])
+		self._rollups = RollupCache(self._rollupsfilename)
 		### Menu ###
 		menubar = tk.Menu(self._root)
 		self._root.config(menu=menubar)
@@ -316,10 +397,21 @@ class YattiMain:
 		timermenu.add_separator()
 		timermenu.add_command(label="Sort Timers by Title",underline=0,
 			command=self._sort_timers_title)
+		timermenu.add_command(label="Sort Timers by Last Activity",underline=15,
+			command=self._sort_timers_activity)
+		timermenu.add_command(label="Sort Timers by Unexported Time",underline=15,
+			command=self._sort_timers_unexported)
+		timermenu.add_command(label="Normalize Time Slices",underline=0,
+			command=self._normalize_intervals)
+		timermenu.add_command(label="Check for Overlapping Time",underline=10,
+			command=self._report_overlaps)
 		timermenu.add_command(label="Archive Exported Time Slices",underline=8,
 			command=self._archive_intervals)
 		timermenu.add_command(label="Archive Selected Timer",underline=10,
 			command=self._archive_selected_timer)
+		timermenu.add_command(label="View Archive",underline=0,command=self._view_archive)
+		timermenu.add_command(label="View Daily Totals",underline=5,
+			command=self._view_daily_totals)
 		# Export menu
 		exportmenu = tk.Menu(menubar, tearoff=False)
 		menubar.add_cascade(label="Export",underline=1,menu=exportmenu)
@@ -334,18 +426,11 @@ class YattiMain:
 			variable=self._pause_other_timers_var)
 		### Left pane ###
 		# Timer button frame
-		self._timerframeouter = tk.Frame(self._root)
-		self._timerframeouter.grid(column=1,row=1,sticky='ns')
-		self._canvas = tk.Canvas(self._timerframeouter)
-		self._timerframe = tk.Frame(self._canvas)
-		self._timerframe.pack()
-		timerscrollbar = tk.Scrollbar(self._timerframeouter,orient='vertical',
-			command=self._canvas.yview)
-		self._canvas.config(yscrollcommand=timerscrollbar.set)
-		timerscrollbar.pack(side='right',fill='y',expand=True)
-		self._canvas.pack(side='left',fill='y',expand=True)
-		self._canvas.create_window((0,0),window=self._timerframe,anchor='nw')
-		self._timerframe.bind('<Configure>',lambda e,self=self: self._canvas_reconfigure)
+		# Only the visible rows get TimerButton widgets; see TimerList
+		self._timerlist = TimerList(self._root,self._settings['timerbuttons'],
+			self._theme['timerbuttons'])
+		self._timerlist.grid(column=1,row=1,sticky='ns')
+		self._timerlist.register_labelclick_callback(self._set_current_timer)
 		# Add quick-add button
 		self._button_font = tkfont.Font()
 		self._quick_add_button = tk.Button(self._root,font=self._button_font,
@@ -353,8 +438,9 @@ class YattiMain:
 		self._quick_add_button.grid(column=1,row=2)
 
 		### Right pane ###
-		self._current_timerbutton = None
-		self._dataeditor_updater = None
+		self._current_timer = None
+		# Intervals (IntervalRows) which overlap another timer's, by timer id; see _check_overlaps
+		self._overlaps = {}
 		dataeditorframe = tk.Frame(self._root)
 		dataeditorframe.grid(row=1,column=2,rowspan=2,sticky='nw')
 		self._dataeditor = DataEditor(dataeditorframe,self.DATA_CONFIG,self._theme['dataeditor'])
@@ -371,8 +457,24 @@ class YattiMain:
 			self._root.bind_all("<Button-5>",self._mousewheel_callback)
 
 		### Adding timer buttons and reconfiguring ###
-		self._load_timers_from_json()
+		renumbered = self._load_timers_from_json()
+		# Timers which were given new ids need to have them saved, so they are left out of what
+		# the data store treats as already saved
+		newids = set(timer.timer_id for timer in renumbered)
+		self._datastore.reset([{key:value for key,value in data.items()
+			if key != 'id' or value not in newids} for data in self._data['timerdata']])
+		if len(renumbered) > 0:
+			self._record_timers(renumbered)
 		self.update_theme()
+		# Put back any running time which was lost last time, and save anything left unsaved
+		self._heartbeat = Heartbeat(self._heartbeatfilename)
+		self._recover_running_time()
+		# Only normalize once the recovered time is back, as joining intervals could remove the
+		# start time which the heartbeat refers to
+		if self._settings['normalize on load']:
+			self._normalize_timers()
+		if len(self._dirty) > 0:
+			self._schedule_autosave()
 
 		self._root.mainloop()
 
@@ -383,27 +485,33 @@ class YattiMain:
 		# Kill all running timers
 		for timer in self._timers:
 			timer.running = False
-		if self._dataeditor_updater != None:
-			self._root.after_cancel(self._dataeditor_updater)
-			self._dataeditor_updater = None
-		# By default, always save results
+		self._ticker.unsubscribe(self._update_dataeditor)
+		self._ticker.unsubscribe(self._beat)
+		if self._autosave_pending != None:
+			self._root.after_cancel(self._autosave_pending)
+		# By default, always save results, and wait for them to be written
 		self._write_all_files()
+		self._filewriter.close()
+		self._datastore.close()
+		# Everything has been saved, so there is nothing left to recover
+		self._heartbeat.clear()
+		self._heartbeat.close()
 		# Die, die, die!
 		self._root.destroy()
 
-	def _set_current_timerbutton (self, tb):
-		"""_set_current_timerbutton internal function
+	def _set_current_timer (self, timer):
+		"""_set_current_timer internal function
 		Called when clicking on a timer label. Initializes the data editor's data.
 		"""
-		self._current_timerbutton = tb
-		self._dataeditor.load_data(self._current_timerbutton._data)
-		self._dataeditor.enable(tables=not self._current_timerbutton.running)
+		self._current_timer = timer
+		self._dataeditor.load_data(self._current_timer._data)
+		self._show_overlaps()
+		self._dataeditor.enable(tables=not self._current_timer.running)
 
-		if self._dataeditor_updater != None:
-			self._root.after_cancel(self._dataeditor_updater)
-			self._dataeditor_updater = None
-		if self._current_timerbutton.running:
-			self._dataeditor_updater = self._root.after(500,self._update_dataeditor)
+		if self._current_timer.running:
+			self._ticker.subscribe(self._update_dataeditor)
+		else:
+			self._ticker.unsubscribe(self._update_dataeditor)
 
 	def _options_toggle (self, target):
 		"""_options_toggle internal function
@@ -412,21 +520,31 @@ class YattiMain:
 		"""
 		if target == 'pause other timers':
 			self._settings['pause other timers'] = self._pause_other_timers_var.get()
+		self._mark_dirty('settings')
 
-	def _update_dataeditor (self):
+	def _update_dataeditor (self, now):
 		"""_update_dataeditor internal function
 		Updates the intervals section of the data editor, allowing a running timer.
+		Subscribed to the ticker while the selected timer is running, so only the open interval
+		changes. As the intervals are sorted by start, that is not always the last one.
 		"""
-		self._dataeditor.update_data_for_key('intervals')
-		self._dataeditor_updater = self._root.after(500,self._update_dataeditor)
+		openinterval = self._current_timer.open_interval if self._current_timer != None else None
+		if openinterval != None and not openinterval.deleted:
+			self._dataeditor.update_data_for_row('intervals',openinterval.index)
 
 	def _data_editor_saved (self, errors):
 		"""_data_editor_saved callback function
 		Called when the data editor save button is clicked. Updates the timer button data.
 		"""
-		if self._current_timerbutton == None:
+		if self._current_timer == None:
 			return
-		self._current_timerbutton.update_data()
+		self._current_timer.update_data()
+		# Edited start times may have moved intervals
+		self._dataeditor.update_data_for_key('intervals')
+		# Keep any overlap highlights up to date while the user fixes them
+		if len(self._overlaps) > 0:
+			self._check_overlaps()
+		self._record_timers([self._current_timer])
 		if len(errors) > 0:
 			self._dataeditorerrors.configure(fg='red',text=str(len(errors))+" errors while saving")
 		else:
@@ -441,7 +559,7 @@ class YattiMain:
 		x,y = self._root.winfo_pointerxy()
 		widget = self._root.winfo_containing(x,y)
 		try:
-			str(widget).index(str(self._timerframeouter))
+			str(widget).index(str(self._timerlist))
 			isovercanvas = True
 		except:
 			isovercanvas = False
@@ -456,118 +574,450 @@ class YattiMain:
 			elif self._running_os == "Linux":
 				scrolldir = -1 if e.delta<0 else 1
 				scrollby = -1*math.ceil(abs(e.delta)/120)
-			self._canvas.yview_scroll(scrolldir*scrollby,'units')
+			self._timerlist.yview_scroll(scrolldir*scrollby,'units')
+
+	def _mark_dirty (self, dictname):
+		"""_mark_dirty internal function
+		Marks dictname's file (settings/theme/data/passwords) as changed, and schedules an
+		autosave.
+		"""
+		self._dirty.add(dictname)
+		self._schedule_autosave()
+
+	def _schedule_autosave (self):
+		"""_schedule_autosave internal function
+		(Re)schedules the autosave for 'autosave delay' seconds from now, so that a burst of
+		changes is only saved once, but never later than 'max loss seconds' after the oldest
+		unsaved change.
+		"""
+		if self._root == None:
+			return
+		now = time.time()
+		if self._autosave_first == None:
+			self._autosave_first = now
+		delay = min(self._settings['autosave delay'],
+			self._autosave_first+self._settings['max loss seconds']-now)
+		if self._autosave_pending != None:
+			self._root.after_cancel(self._autosave_pending)
+		self._autosave_pending = self._root.after(max(int(delay*1000),0),self._autosave)
+
+	def _autosave (self):
+		"""_autosave callback function
+		Writes whichever files have changed.
+		"""
+		self._autosave_pending = None
+		self._autosave_first = None
+		self._write_all_files()
+
+	def _update_heartbeat (self):
+		"""_update_heartbeat internal function
+		Records the running timers in the heartbeat file straight away, and keeps recording them
+		every 'max loss seconds' while any are running. Used whenever timers are started/stopped
+		or removed.
+		"""
+		if any(timer.running for timer in self._timers):
+			self._ticker.subscribe(self._beat)
+			self._beat(time.time(),force=True)
+		else:
+			self._ticker.unsubscribe(self._beat)
+			self._heartbeat.clear()
+
+	def _beat (self, now, force=False):
+		"""_beat callback function
+		Subscribed to the ticker while any timer is running. Writes the id and open interval
+		start of each running timer to the heartbeat file every 'max loss seconds'.
+		"""
+		if not force and now-self._last_beat < self._settings['max loss seconds']:
+			return
+		self._last_beat = now
+		self._heartbeat.beat([(timer.timer_id,timer.open_interval[0],now)
+			for timer in self._timers
+			if timer.running and timer.open_interval != None])
+
+	def _recover_running_time (self):
+		"""_recover_running_time internal function
+		Puts back any running time recorded in the heartbeat file which did not make it into
+		the saved data (i.e. the program did not close cleanly). Intervals are matched by their
+		start time, falling back on the timer's id.
+		"""
+		records = self._heartbeat.records()
+		if len(records) == 0:
+			return
+		starts = {record[1] for record in records}
+		intervalsbystart = {}
+		for timer in self._timers:
+			for interval in timer._data['intervals']:
+				if interval[0] in starts:
+					intervalsbystart[interval[0]] = (timer,interval)
+		changedtimers = []
+		recovered = 0
+		for timerid,start,beat in records:
+			if start in intervalsbystart:
+				timer,interval = intervalsbystart[start]
+				if interval[1] >= beat:
+					continue
+				recovered += beat-interval[1]
+				interval[1] = beat
+			elif timerid in self._timers_by_id:
+				timer = self._timers_by_id[timerid]
+				timer._data['intervals'].insert_sorted([start,beat,False,""])
+				recovered += beat-start
+			else:
+				continue
+			if timer not in changedtimers:
+				changedtimers.append(timer)
+		for timer in changedtimers:
+			timer.update_data()
+		self._record_timers(changedtimers)
+		self._heartbeat.clear()
+		if len(changedtimers) > 0:
+			tkmessagebox.showinfo(title="Recovered Running Time",
+				message="YATTi did not close cleanly last time.\n"+ \
+				"Recovered {} minutes of running time for {} timers.".format(
+					int(recovered/60),len(changedtimers)))
 
 	def _write_all_files (self):
 		"""_write_all_files internal function
-		Writes the settings, theme, data, and passwords dictionaries to their respective files.
+		Writes whichever of the settings, theme, data, and passwords dictionaries have changed
+		to their respective files.
 		"""
-		self._write_file("settings",self._settings,self._dirs.user_config_dir,
+		self._write_dirty_file("settings",self._settings,self._dirs.user_config_dir,
 			self._settingsfilename)
-		self._write_file("theme",self._theme,self._dirs.user_config_dir,
+		self._write_dirty_file("theme",self._theme,self._dirs.user_config_dir,
 			self._settings['theme file'])
-		self._write_file("data",self._data,self._dirs.user_data_dir,
-			self._settings['data file'])
-		self._write_file("passwords",self._passwords,self._dirs.user_config_dir,
+		self._write_data_file()
+		self._write_rollups()
+		self._write_dirty_file("passwords",self._passwords,self._dirs.user_config_dir,
 			self._settings['passwords file'],self._encrypt_password_file)
 
-	def _write_file (self, dictname, sourcedict, filedir, filename, wrapperfunc = None):
+	def _write_dirty_file (self, dictname, sourcedict, filedir, filename, wrapperfunc = None):
+		"""_write_dirty_file internal function
+		Writes the file (see _write_file) if dictname is marked as changed. The mark is cleared
+		once the snapshot is queued, and put back if the write fails.
+		"""
+		if dictname not in self._dirty:
+			return True
+		self._dirty.discard(dictname)
+		if self._write_file(dictname,sourcedict,filedir,filename,wrapperfunc,
+			lambda success,self=self,dictname=dictname: self._dirty_file_written(success,dictname)):
+			return True
+		self._dirty.add(dictname)
+		return False
+
+	def _dirty_file_written (self, success, dictname):
+		"""_dirty_file_written callback function
+		Marks dictname as changed again if its file could not be written.
+		"""
+		if not success:
+			self._dirty.add(dictname)
+
+	def _write_rollups (self):
+		"""_write_rollups internal function
+		Writes the daily totals cache, if it has changed. It is rebuilt from the data if it is
+		ever out of date, so it never needs to be written with the data.
+		"""
+		if not self._rollups.changed:
+			return True
+		if self._write_file("rollups",self._rollups.snapshot(),self._dirs.user_data_dir,
+			self._settings['data file']+".rollups",
+			callback=lambda success,self=self: self._rollups_written(success)):
+			return True
+		self._rollups.changed = True
+		return False
+
+	def _rollups_written (self, success):
+		"""_rollups_written callback function
+		Marks the daily totals cache as changed again if it could not be written.
+		"""
+		if not success:
+			self._rollups.changed = True
+
+	def _write_data_file (self):
+		"""_write_data_file internal function
+		Persists the timer data. When saving incrementally (journaling or SQLite), only the changes
+		since the last save are recorded, and the full snapshot is only rewritten once enough
+		journal records have built up.
+		"""
+		if self._incremental_saves:
+			self._record_timers(self._timers)
+			if not self._datastore.needs_compaction():
+				return True
+		# Running timers change the data every second, without anything being marked
+		elif 'data' not in self._dirty and not any(timer.running for timer in self._timers):
+			return True
+		return self._compact_journal()
+
+	def _compact_journal (self):
+		"""_compact_journal internal function
+		Writes the full data snapshot (including the current journal sequence) and then, once it
+		has been written, drops the records it includes from the journal.
+		"""
+		sequence = self._datastore.sequence
+		self._data['journal sequence'] = sequence
+		self._dirty.discard('data')
+		if self._write_file("data",self._data,self._dirs.user_data_dir,
+			self._settings['data file'],
+			callback=lambda success,self=self,sequence=sequence:
+				self._journal_compacted(success,sequence)):
+			return True
+		self._dirty.add('data')
+		return False
+
+	def _journal_compacted (self, success, sequence):
+		"""_journal_compacted callback function
+		Called once the data snapshot written by _compact_journal has finished.
+		"""
+		if success:
+			self._datastore.compacted(sequence)
+		else:
+			self._dirty.add('data')
+
+	def _record_timers (self, timers):
+		"""_record_timers internal function
+		Marks the data as changed, and records any unsaved changes for the given timers in the
+		data store (journal or SQLite), if saving incrementally. Returns False if they could not
+		be recorded, in which case the data store must not be queried.
+		"""
+		# When saving incrementally, the data store itself is the save
+		if not self._incremental_saves:
+			self._mark_dirty('data')
+			return True
+		self._dirty.add('data')
+		try:
+			for timer in timers:
+				self._datastore.record_timer(self._timer_positions[timer.timer_id],timer._data)
+			return True
+		# TODO: Switch to debug file
+		except:
+			print("Data changes could not be written to the data store.",file=sys.stderr)
+			traceback.print_exc()
+			return False
+
+	def _write_file (self, dictname, sourcedict, filedir, filename, wrapperfunc = None,
+		callback = None):
 		"""_write_file internal function
-		Writes the given sourcedict as JSON to the given filename, optionally running wrapperfunc
-		on the JSON first.
+		Queues the given sourcedict to be written as JSON to the given filename by the background
+		file writer, optionally running wrapperfunc on the JSON first. Returns True if it was
+		queued. callback, if given, is called with True/False once the write has finished.
 		"""
-		# Create the directory
-		if not os.path.exists(filedir):
-			os.makedirs(filedir)
-		# Try to write out the JSON
+		fullname = filedir+os.sep+filename
 		try:
-			with open(filedir+os.sep+filename,'w') as fileobj:
-				if wrapperfunc == None:
-					json.dump(sourcedict,fileobj,indent="\t",separators=(', ',':'))
-				else:
-					fileobj.write(wrapperfunc(json.dumps(sourcedict,indent="\t",separators=(', ',':'))))
+			self._filewriter.write_json(fullname,sourcedict,wrapperfunc,
+				lambda success,self=self,dictname=dictname,fullname=fullname,callback=callback:
+					self._file_written(success,dictname,fullname,callback))
 			return True
 		# If we can't, notify the user
 		# TODO: Switch to debug file
 		except:
-			print(dictname+" JSON could not be written to "+(filedir+os.sep+filename)+".",
-				file=sys.stderr)
+			print(dictname+" JSON could not be written to "+fullname+".",file=sys.stderr)
 			traceback.print_exc()
 			return False
 
+	def _file_written (self, success, dictname, fullname, callback):
+		"""_file_written callback function
+		Called once a file queued by _write_file has been written (or failed to be).
+		"""
+		# TODO: Switch to debug file
+		if not success:
+			print(dictname+" JSON could not be written to "+fullname+".",file=sys.stderr)
+		if callback != None:
+			callback(success)
+
 	def _load_timers_from_json (self):
 		"""_load_timers_from_json internal function
 		Adds all the timers found in the JSON file that was read in at the start of the program.
+		Returns the list of timers which had to be given a new id (see _assign_timer_id).
 		"""
-		for data in self._data['timerdata']:
-			self._add_timer(data)
+		renumbered = []
+		# The database has just been loaded, so its totals can be used as they are
+		summaries = self._datastore.interval_summaries() if self._indexed_queries else {}
+		for position,data in enumerate(self._data['timerdata']):
+			oldid = data.get('id')
+			self._add_timer(data,refresh=False,summary=summaries.get(position))
+			if self._timers[-1].timer_id != oldid:
+				renumbered.append(self._timers[-1])
+		self._timerlist.set_models(self._timers)
+		return renumbered
+
+	def _assign_timer_id (self, timerdata):
+		"""_assign_timer_id internal function
+		Gives the timer dict a new unique id, unless it already has one which is not yet taken.
+		Ids are never reused, as the archive and heartbeat may still refer to old ones, so when
+		saving incrementally the counter is recorded in the data store as soon as it goes up.
+		"""
+		timerid = timerdata.get('id')
+		if type(timerid) != int or timerid in self._timers_by_id:
+			timerid = self._data['next timer id']
+			timerdata['id'] = timerid
+		# Old data files may have ids but no counter, so never trust it to be ahead of the ids
+		if timerid >= self._data['next timer id']:
+			self._data['next timer id'] = timerid+1
+			if self._incremental_saves:
+				self._datastore.record_meta('next timer id',self._data['next timer id'])
+		return timerid
+
+	def _reindex_timers (self):
+		"""_reindex_timers internal function
+		Rebuilds the id -> position lookup. Used whenever timers are reordered or removed.
+		"""
+		self._timer_positions = {timer.timer_id:i for i,timer in enumerate(self._timers)}
+
+	def _check_overlaps (self):
+		"""_check_overlaps internal function
+		Finds every interval which overlaps another timer's interval (see helper.findOverlaps),
+		and highlights any belonging to the selected timer in the data editor. Returns the
+		number of overlapping intervals.
+		"""
+		overlaps = helper.findOverlaps(self._data['timerdata'])
+		self._overlaps = {}
+		for position,indexes in overlaps.items():
+			intervals = self._timers[position]._data['intervals']
+			self._overlaps[self._timers[position].timer_id] = [intervals[i] for i in indexes]
+		self._show_overlaps()
+		return sum(len(indexes) for indexes in overlaps.values())
+
+	def _show_overlaps (self):
+		"""_show_overlaps internal function
+		Highlights the selected timer's overlapping intervals (as of the last _check_overlaps)
+		in the data editor.
+		"""
+		if self._current_timer == None:
+			return
+		rows = self._overlaps.get(self._current_timer.timer_id,[])
+		self._dataeditor.highlight_rows('intervals',[row.index for row in rows if not row.deleted])
+
+	def _report_overlaps (self):
+		"""_report_overlaps callback function
+		Checks for overlapping time on demand, and tells the user what was found.
+		"""
+		numoverlaps = self._check_overlaps()
+		if numoverlaps == 0:
+			tkmessagebox.showinfo(title="No Overlapping Time",
+				message="No time slices overlap with time on other timers.")
+		else:
+			tkmessagebox.showwarning(title="Overlapping Time",
+				message=("{} time slices in {} timers overlap with time on other timers.\n"+
+					"They are highlighted in the data editor.").format(
+						numoverlaps,len(self._overlaps)))
 
 	def _export_to_csv (self):
 		"""_export_to_csv internal function
-		Sets up and runs the CSV export class to export current data to CSV.
+		Sets up and runs the CSV export class to export current data to CSV. Any overlapping time
+		is highlighted first (the export itself warns about it).
 		"""
+		self._check_overlaps()
+		# The export queries the database (if any), so everything must be recorded first
+		datastore = None
+		if self._indexed_queries and self._record_timers(self._timers):
+			datastore = self._datastore
 		exportwindow = CSVExport(self._root,self._data,
-			self._settings['csvexport'],self._theme['csvexport'])
+			self._settings['csvexport'],self._theme['csvexport'],datastore)
 		self._root.wait_window(exportwindow)
-		for timer in self._timers:
-			timer.update_data()
-		if self._current_timerbutton != None:
+		# The export may have changed its settings and marked intervals as exported
+		self._mark_dirty('settings')
+		recorded = self._record_timers(self._timers)
+		summaries = self._datastore.interval_summaries() if self._indexed_queries and recorded \
+			else {}
+		for position,timer in enumerate(self._timers):
+			timer.update_data(summaries.get(position))
+		if self._current_timer != None:
 			self._dataeditor.update_data_for_key('intervals')
 
-	def _add_timer (self, timerdata=None):
+	def _add_timer (self, timerdata=None, refresh=True, summary=None):
 		"""_add_timer internal function
-		Adds a timer button to the list. timerdata can be specified if loading an existing timer.
+		Adds a timer to the list. timerdata can be specified if loading an existing timer.
+		If refresh is False, the timer list is not updated (for adding many timers at once).
+		summary is the timer's totals from the data store, if known (see TimerModel).
 		"""
-		if timerdata == None:
+		newtimer = timerdata == None
+		if newtimer:
 			self._data['timerdata'].append({})
 			timerdata = self._data['timerdata'][-1]
-		self._timers.append(TimerButton(self._timerframe,timerdata,self._settings['timerbuttons'],
-			self._theme['timerbuttons']))
-		self._timers[-1].pack()
-		self._timers[-1].update_theme()
+		timerid = self._assign_timer_id(timerdata)
+		self._timers.append(TimerModel(timerdata,self._settings['timerbuttons'],self._ticker,
+			summary))
+		self._timers_by_id[timerid] = self._timers[-1]
+		self._timer_positions[timerid] = len(self._timers)-1
+		self._rollups.attach(timerid,self._timers[-1]._data['intervals'])
+		if newtimer:
+			self._mark_dirty('data')
+		if newtimer and self._incremental_saves:
+			self._datastore.record_add(len(self._timers)-1,self._timers[-1]._data)
 		self._timers[-1].register_toggle_callback(self._timer_toggled)
-		self._timers[-1].register_labelclick_callback(self._set_current_timerbutton)
-		self._canvas_reconfigure()
-		self._canvas.yview_moveto(1)
+		if refresh:
+			self._timerlist.append(self._timers[-1])
+			self._timerlist.see(-1)
 
 	def _sort_timers_title (self):
 		"""_sort_timers_title internal function
 		Sorts the timer list by the titles of the timers and then reload the list.
 		"""
-		self._data['timerdata'].sort(key=lambda i: i['title'])
+		self._sort_timers(lambda timer: timer._data['title'])
+
+	def _sort_timers_activity (self):
+		"""_sort_timers_activity internal function
+		Sorts the timer list by when each timer was last running, most recent first.
+		"""
+		self._sort_timers(lambda timer: timer.last_activity() or 0,reverse=True)
+
+	def _sort_timers_unexported (self):
+		"""_sort_timers_unexported internal function
+		Sorts the timer list by the total unexported time of each timer, largest first.
+		"""
+		self._sort_timers(lambda timer: timer.total_elapsed_time(),reverse=True)
+
+	def _sort_timers (self, key, reverse=False):
+		"""_sort_timers internal function
+		Sorts the timer data by key (a function of a TimerModel, which should only use the timer's
+		cached values) and then reorders the timer list to match. The existing timers and their
+		buttons are kept, so running and selected timers are unaffected.
+		"""
+		# Journal any outstanding changes before the indexes change, then journal the new order
+		self._record_timers(self._timers)
+		order = sorted(range(len(self._timers)),key=lambda i: key(self._timers[i]),
+			reverse=reverse)
+		self._data['timerdata'][:] = [self._data['timerdata'][i] for i in order]
+		if self._incremental_saves:
+			self._datastore.record_order(order)
 		self._reload_timers()
 
 	def _reload_timers (self):
 		"""_reload_timers internal function
-		Removes and then readds all of the timerbuttons. Remembers running timers and selected
-		timer. Used whenever timers are removed or change order in the data.
-		"""
-		# Remember which timers were selected/running.
-		current_timer_data = None
-		running_timers = []
-		if self._current_timerbutton != None:
-			current_timer_data = self._current_timerbutton._data
-			self._current_timerbutton = None
-		for timer in self._timers:
-			if timer.running:
-				running_timers.append(timer._data)
-				timer.running = False
-		# Remove all the old timer buttons and re-add in sorted order.
-		for timer in self._timers:
-			timer.destroy()
-		self._timers = []
-		self._load_timers_from_json()
-		# Restart any running timers
-		for timer in self._timers:
-			if timer._data in running_timers:
-				timer.running = True
-		# Reselect the previously selected timer
+		Re-orders the timers to match the order of the timer data, and then re-binds the visible
+		timer buttons. The timers themselves are kept, so running and selected timers are
+		unaffected. Used whenever timers change order in the data.
+		"""
+		self._timers = [self._timers_by_id[data['id']] for data in self._data['timerdata']]
+		self._reindex_timers()
+		self._timerlist.set_models(self._timers)
+
+	def _normalize_timers (self):
+		"""_normalize_timers internal function
+		Normalizes the intervals of every (stopped) timer; see TimerModel.normalize_intervals.
+		Returns a tuple of (intervals joined, intervals deleted, timers changed).
+		"""
+		joined = 0
+		deleted = 0
+		changedtimers = []
 		for timer in self._timers:
-			if timer._data == current_timer_data:
-				self._current_timerbutton = timer
-				# Also check if the selected timer is running; if so, run the logic for such
-				if timer._data in running_timers:
-					self._timer_toggled(timer)
+			timerjoined,timerdeleted = timer.normalize_intervals()
+			if timerjoined+timerdeleted > 0:
+				joined += timerjoined
+				deleted += timerdeleted
+				changedtimers.append(timer)
+		self._record_timers(changedtimers)
+		return (joined,deleted,len(changedtimers))
+
+	def _normalize_intervals (self):
+		"""_normalize_intervals callback function
+		Normalizes every timer's intervals on demand, and tells the user what changed.
+		"""
+		joined,deleted,numtimers = self._normalize_timers()
+		if self._current_timer != None:
+			self._dataeditor.update_data_for_key('intervals')
+		tkmessagebox.showinfo(title="Normalized Time Slices",
+			message="Joined {} time slices and deleted {} short time slices in {} timers.".format(
+				joined,deleted,numtimers))
 
 	def _archive_intervals (self):
 		"""_archive_intervals callback function
@@ -597,59 +1047,51 @@ class YattiMain:
 
 	def _archive_timer_intervals (self, timer, exportedonly=True):
 		"""_archive_timer_intervals internal function
-		Removes intervals from a timer and puts them in separate "archive" files.
+		Removes intervals from a timer and appends them to the archive store.
 		If exportedonly is False, unexported time will also be archived.
+		Returns the number of intervals archived, or -1 if they could not be archived.
 		"""
 		timerdata = timer._data
-		filename = "YATTi_archive_"+timerdata['title']+".json"
-		filedir = self._dirs.user_data_dir
-		# First try to read in the file, in case there's any existing data
-		archivedata = {}
+		position = self._timer_positions[timer.timer_id]
+		# Gather the intervals we want to export, from the database's index if there is one
+		if self._indexed_queries and self._record_timers([timer]):
+			exportintervals = [timerdata['intervals'][i] for i in
+				self._datastore.interval_positions(position,True if exportedonly else None)]
+		else:
+			exportintervals = [interval for interval in timerdata['intervals']
+				if interval[2] or not exportedonly]
+		if len(exportintervals) == 0:
+			return 0
+		# Try to write them out
 		try:
-			with open(filedir+os.sep+filename,'r') as f:
-				archivedata = json.load(f)
+			self._archive.archive(ArchiveStore.timer_key(timerdata),timerdata,exportintervals)
+		# TODO: Switch to debug file
 		except:
-			# TODO: log some debug data
-			pass
-		# Fill in the timer details (we don't care about version)
-		archivedata['title'] = timerdata['title']
-		archivedata['description'] = timerdata['description']
-		archivedata['source system'] = timerdata['source system']
-		# Gather the intervals we want to export
-		exportintervals = []
-		for interval in timerdata['intervals']:
-			if interval[2] or not exportedonly:
-				exportintervals.append(interval)
-		# Next, merge any existing data and our current timer data
-		if 'intervals' in archivedata and type(archivedata['intervals']) == type([]):
-			archivedata['intervals'] += exportintervals
-		else:
-			archivedata['intervals'] = exportintervals
-		# Finally, try to write it out
-		if self._write_file("Archive",archivedata,filedir,filename):
-			# If we succeeded in writing the intervals out, remove them from current data
-			# and then update the timer (and possibly the data editor)
-			for interval in exportintervals:
-				timerdata['intervals'].remove(interval)
-			timer.update_data()
-			return len(exportintervals)
-		else:
+			print("Intervals for "+timerdata['title']+" could not be archived.",file=sys.stderr)
+			traceback.print_exc()
 			return -1
+		# If we succeeded in writing the intervals out, remove them from current data
+		# and then update the timer (and possibly the data editor)
+		timerdata['intervals'].delete_rows([interval.index for interval in exportintervals])
+		summary = None
+		if self._record_timers([timer]) and self._indexed_queries:
+			summary = self._datastore.interval_summaries(position)[position]
+		timer.update_data(summary)
+		return len(exportintervals)
 
 	def _archive_selected_timer (self):
 		"""_archive_selected_timer callback function
 		Archives all intervals for the currently-selected timer and then removes the whole
 		timer from the list of timers.
 		"""
-		timer = self._current_timerbutton
+		timer = self._current_timer
 		if timer == None:
 			return
 		# Shut down any related afters
 		if timer.running:
 			timer.running = False
-		if self._dataeditor_updater != None:
-			self._root.after_cancel(self._dataeditor_updater)
-			self._dataeditor_updater = None
+			self._update_heartbeat()
+		self._ticker.unsubscribe(self._update_dataeditor)
 		self._dataeditor.enable(False)
 		# Archive all intervals
 		success = self._archive_timer_intervals(timer,exportedonly=False)
@@ -662,33 +1104,73 @@ class YattiMain:
 		self._dataeditor.update_data()
 		self._dataeditor.clear_data()
 		# Remove the timer completely
-		self._data['timerdata'].remove(timer._data)
-		timer.pack_forget()
-		timer.destroy()
-		self._timers.remove(timer)
-		self._current_timerbutton = None
+		self._mark_dirty('data')
+		position = self._timer_positions[timer.timer_id]
+		if self._incremental_saves:
+			self._datastore.record_remove(position)
+		del self._data['timerdata'][position]
+		del self._timers[position]
+		del self._timers_by_id[timer.timer_id]
+		self._rollups.detach(timer.timer_id)
+		self._reindex_timers()
+		self._timerlist.remove(timer)
+		self._current_timer = None
 		# Notify the user
 		tkmessagebox.showinfo(title="Timer Successfully Archived",
 			message="Timer successfully archived. {} intervals archived.".format(success))
 
+	def _view_archive (self):
+		"""_view_archive callback function
+		Opens the archive viewer.
+		"""
+		ArchiveViewer(self._root,self._archive,self._theme['archiveviewer'])
+
+	def _view_daily_totals (self):
+		"""_view_daily_totals callback function
+		Shows the total time for each of the last seven days and this and last week, for all
+		timers and for the selected timer, from the daily totals cache.
+		"""
+		today = time.localtime()
+		def localDate (daysago):
+			return time.strftime(RollupCache.DATE_FORMAT,time.localtime(time.mktime(
+				(today.tm_year,today.tm_mon,today.tm_mday-daysago,12,0,0,0,0,-1))))
+		# The Sunday of last week
+		first = localDate((today.tm_wday+1)%7+7)
+		timers = [("All timers",None)]
+		if self._current_timer != None:
+			timers.append((self._current_timer._data['title'],self._current_timer.timer_id))
+		lines = []
+		for title,timerid in timers:
+			days = self._rollups.day_totals(timerid,first=localDate(6))
+			weeks = self._rollups.week_totals(timerid,first=first)
+			lines.append(title)
+			for daysago in range(6,-1,-1):
+				date = localDate(daysago)
+				lines.append("    {}  {:>6.2f}h".format(date,days.get(date,0)/60/60))
+			for week in sorted(weeks):
+				lines.append("    Week of {}  {:>6.2f}h".format(week,weeks[week]/60/60))
+		tkmessagebox.showinfo(title="Daily Totals",message="\n".join(lines))
+
 	def _timer_toggled (self, thetimer):
 		"""_timer_toggled callback function
 		The function which is called for each timer when said timer is toggled.
 		"""
 		# If we want to pause other timers when this one is started, do so
+		changedtimers = [thetimer]
 		if self._settings['pause other timers'] and thetimer.running:
 			for timer in self._timers:
-				if timer != thetimer:
+				if timer != thetimer and timer.running:
 					timer.running = False
-		# If there is a running dataeditor updater, cancel it before checking if we should start
-		# a new one
-		if self._dataeditor_updater != None:
-			self._root.after_cancel(self._dataeditor_updater)
-			self._dataeditor_updater = None
-		if thetimer == self._current_timerbutton:
-			self._dataeditor.enable(tables=not self._current_timerbutton.running)
-			if self._current_timerbutton.running:
-				self._dataeditor_updater = self._root.after(500,self._update_dataeditor)
+					changedtimers.append(timer)
+		self._record_timers(changedtimers)
+		self._update_heartbeat()
+		# Only keep the data editor updating while the selected timer is running
+		if self._current_timer in changedtimers:
+			self._dataeditor.enable(tables=not self._current_timer.running)
+		if self._current_timer != None and self._current_timer.running:
+			self._ticker.subscribe(self._update_dataeditor)
+		else:
+			self._ticker.unsubscribe(self._update_dataeditor)
 
 	def update_theme (self):
 		"""update_theme function
@@ -703,7 +1185,7 @@ class YattiMain:
 		fontwidgets = (
 			(self._button_font,'buttons'),
 		)
-		subwidgets = [self._dataeditor]+self._timers
+		subwidgets = [self._dataeditor,self._timerlist]
 
 		for widget,name in widgets:
 			helper.configThemeFromDict(widget,self._theme,'base',name)